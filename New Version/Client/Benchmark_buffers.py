@@ -0,0 +1,79 @@
+import os
+import sys
+import csv
+import time
+import tempfile
+from Camera_manager import CameraManager, Picamera2, buffer_budget, buffer_count_for, BUFFER_BYTES_PER_PIXEL
+from Encode_pool import EncodePool
+from Fake_camera import FakeCamera
+
+# Frame rate of a burst of back-to-back captures in capture_request mode for 1 to N camera buffers,
+# N being what the memory budget allows at the resolution (or --max-buffers). The rate counts until the
+# last frame is written, so a buffer only helps if it lets the encoding overlap the next captures.
+# Uses the real camera when picamera2 is available, the fake camera otherwise or with --fake.
+# Usage: python Benchmark_buffers.py [width height] [--frames N] [--max-buffers N] [--fake]
+
+CONTROLS = {"AnalogueGain": 1.0, "ColourGains": (1.0, 1.0), "Brightness": 0.5, "Contrast": 1.0}
+
+# Seconds to capture and write a burst of frames with a given number of buffers
+def burst(manager, width, height, exposure_time, buffer_count, frames, folder):
+    manager.configure(width, height, exposure_time, CONTROLS, buffer_count)
+    pool = EncodePool().start()
+    try:
+        for index in range(2):  # Warm the pipeline up
+            save, _ = manager.capture_request()
+            pool.submit(save, os.path.join(folder, f'warmup{index}.jpg'))
+        pool.drain()
+        start_time = time.perf_counter()
+        for index in range(frames):
+            save, _ = manager.capture_request()
+            pool.submit(save, os.path.join(folder, f'img{index}.jpg'))
+        acknowledged = time.perf_counter() - start_time
+        pool.drain()
+        return acknowledged, time.perf_counter() - start_time
+    finally:
+        pool.stop()
+
+def main(width, height, exposure_time, frames, max_buffers, use_fake, csv_file='buffer_benchmark.csv'):
+    camera_factory = FakeCamera if use_fake or Picamera2 is None else Picamera2
+    max_buffers = max_buffers or buffer_count_for(width, height)
+    buffer_mb = width * height * BUFFER_BYTES_PER_PIXEL / 1e6
+    print(f"Camera backend: {camera_factory.__name__}, {width}x{height}, {buffer_mb:.0f} MB per buffer, "
+          f"budget {buffer_budget() / 1e6:.0f} MB ({max_buffers} buffers)")
+    manager = CameraManager(camera_factory)
+    rows = []
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            for buffer_count in range(1, max_buffers + 1):
+                acknowledged, total = burst(manager, width, height, exposure_time, buffer_count, frames, folder)
+                fps = frames / total
+                gain = fps - rows[-1][3] if rows else 0.0
+                rows.append([buffer_count, buffer_count * buffer_mb, frames / acknowledged, fps, gain])
+                print(f"{buffer_count} buffer(s), {buffer_count * buffer_mb:.0f} MB: {fps:.2f} fps "
+                      f"(ACK rate {frames / acknowledged:.2f} fps), {gain:+.2f} fps for this buffer")
+    finally:
+        manager.close()
+    with open(csv_file, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Buffers', 'Buffer memory (MB)', 'ACK rate (fps)', 'Frame rate (fps)', 'Gain (fps)'])
+        writer.writerows(rows)
+    print(f"Results saved in {csv_file}")
+    return rows
+
+# Remove an integer option and its value from the arguments
+def pop_option(arguments, name, default):
+    if name not in arguments:
+        return default
+    index = arguments.index(name)
+    value = int(arguments[index + 1])
+    del arguments[index:index + 2]
+    return value
+
+if __name__ == '__main__':
+    arguments = sys.argv[1:]
+    frames = pop_option(arguments, '--frames', 30)
+    max_buffers = pop_option(arguments, '--max-buffers', None)
+    use_fake = '--fake' in arguments
+    positional = [int(value) for value in arguments if not value.startswith('--')]
+    width, height = positional[:2] if len(positional) >= 2 else (4056, 3040)
+    main(width, height, 10000, frames, max_buffers, use_fake)
@@ -0,0 +1,56 @@
+import sys
+import time
+from Camera_manager import CameraManager, Picamera2
+from Fake_camera import FakeCamera
+
+# Compare the cost of changing the capture settings with a full camera teardown
+# (what TimeCapture and the per-session clients used to do) and with the camera manager.
+# Uses the real camera when picamera2 is available, the fake camera otherwise or with --fake.
+
+CONTROLS = {"AnalogueGain": 1.0, "ColourGains": (1.0, 1.0), "Brightness": 0.5, "Contrast": 1.0}
+
+# Create, configure, start, stop and close a camera for every setting
+def teardown_switches(camera_factory, settings):
+    times = []
+    for width, height, exposure_time in settings:
+        start_time = time.perf_counter()
+        camera = camera_factory()
+        camera.configure(camera.create_still_configuration(main={"size": (width, height)}, buffer_count=1))
+        camera.set_controls(dict(CONTROLS, ExposureTime=exposure_time))
+        camera.start()
+        times.append(time.perf_counter() - start_time)
+        camera.stop()
+        camera.close()
+    return times
+
+# Keep one camera open and switch through the same settings
+def manager_switches(camera_factory, settings):
+    manager = CameraManager(camera_factory)
+    try:
+        for width, height, exposure_time in settings:
+            manager.configure(width, height, exposure_time, CONTROLS)
+    finally:
+        manager.close()
+    return manager.switch_times
+
+def main(use_fake):
+    camera_factory = FakeCamera if use_fake or Picamera2 is None else Picamera2
+    print(f"Camera backend: {camera_factory.__name__}")
+    resolutions = [(1280, 720), (1920, 1080), (4056, 3040)]
+    exposure_times = [1000, 5000, 10000]
+    # Exposure sweeps within a resolution, then the next resolution, then back to the first ones
+    settings = [(w, h, e) for w, h in resolutions for e in exposure_times] * 2
+
+    teardown = teardown_switches(camera_factory, settings)
+    print(f"Teardown per setting: mean {sum(teardown) / len(teardown) * 1000:.1f} ms")
+
+    switches = manager_switches(camera_factory, settings)
+    for kind in ('open', 'resolution', 'controls'):
+        times = [seconds for switch_kind, seconds in switches if switch_kind == kind]
+        if times:
+            print(f"Manager {kind} switch: {len(times)} x mean {sum(times) / len(times) * 1000:.1f} ms")
+    total = sum(seconds for _, seconds in switches)
+    print(f"Total switching time: teardown {sum(teardown):.2f} s, manager {total:.2f} s")
+
+if __name__ == '__main__':
+    main('--fake' in sys.argv)
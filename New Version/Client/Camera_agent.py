@@ -0,0 +1,495 @@
+import os
+import re
+import time
+import shutil
+import socket
+import zipfile
+import subprocess
+import psutil
+import paramiko
+import numpy as np
+from scp import SCPClient
+from Frame_transfer import serve_frame_requests
+from Incremental_archive import IncrementalArchiver
+from Camera_manager import CameraManager, exposure_start_ns
+from Resource_monitor import ResourceMonitor
+from Thermal_controller import ThermalController
+from Latency_detector import LatencyDetector
+from Storage_manager import StorageManager, tmpfs_size
+from Encode_pool import EncodePool
+from Raw_frame import RAW_EXTENSION
+
+# Long-running camera agent. It is started once per boot (or by the server the first time a
+# session finds it missing), pays the system setup and the camera start once, then keeps the
+# camera open and serves one capture session after another over the control socket.
+#
+# Session protocol, one message per line:
+#   server -> agent: SESSION <mode> <profile> <transfer_mode>
+#   agent -> server: SESSION_READY <camera number> <cold|warm> <setup seconds> <tmpfs bytes>
+#   server -> agent: SETTINGS <width> <height> <exposure_time> [<capture mode> [<buffer count>]]
+#   agent -> server: CONFIGURED
+# then the capture commands of the mode (TAKE_PHOTO, STOP_RECORD, ...).
+#   server -> agent: TAKE_PHOTO <trigger id> <trigger time ns>
+#   agent -> server: PHOTO_TAKEN <trigger id>, or PHOTO_FAILED <trigger id> when the capture raised
+# The trigger id increases by one per trigger of the session and is the same on every camera: the frame is
+# saved as img<trigger id> and the id is in the metadata file, so a command missed by one camera cannot shift
+# the frame numbers of the others. A server without trigger ids sends TAKE_PHOTO <trigger time ns>, the
+# photo count of the camera is used instead.
+# Capture mode 'file' (default) acknowledges a frame once its JPEG is written; 'request' acknowledges it
+# once the sensor delivered it and leaves the encoding to a pool of workers; 'raw' does the same but only
+# writes the YUV420 buffer (Raw_frame.py), the server encodes it. The buffer count of the still
+# configuration (0: as many as fit in the memory budget) lets the encoding overlap the next captures.
+# An anomalous capture latency is reported as soon as it is detected with ANOMALY <camera number> <photo> <error %>
+# before the acknowledgment (the photos of the detector warmup are reported when it completes).
+# When throttling is predicted, THROTTLE <camera number> <seconds until throttling or -> <slowdown factor>
+# precedes the acknowledgment; the server may answer with CADENCE <trigger interval> between two frames.
+
+SERVER_IP = '192.168.1.253'
+PORT = 5000
+SERVER_USERNAME = 'admin'
+SERVER_PASSWORD = 'Admin'
+
+RAM_THRESHOLD = 90.0  # RAM usage threshold (percentage) for stopping the capture
+TMPFS_THRESHOLD = 90.0  # Define tmpfs usage limit
+MAX_TEMP = 40.0
+MAX_CPU_USAGE = 20.0
+THROTTLE_TEMP = 80.0  # The firmware starts throttling the ARM clock at this temperature
+
+ram_folder = '/mnt/ram_images'
+image_format = 'jpg'
+image_prefix = 'img'
+
+# Camera controls per profile. Every control is set explicitly since the camera stays open
+# between sessions and would otherwise keep the values of the previous profile. AwbEnable is left to the
+# camera in the standard profile, as the checkerboard, timing and stereo scripts did: it stays at its default
+# (enabled), which is also what the speckle profile sets.
+CAMERA_PROFILES = {
+    'speckle': {
+        "AnalogueGain": 2.0,             # Set analog gain
+        "AwbEnable": True,               # Enable auto white balance
+        "ColourGains": (1.0, 1.0),       # Set color gains for white balance
+        "Brightness": 0.5,               # Set brightness
+        "Contrast": 1.0,                 # Set contrast
+    },
+    'standard': {
+        "AnalogueGain": 1.0,
+        "ColourGains": (1.0, 1.0),
+        "Brightness": 0.5,
+        "Contrast": 1.0,
+    },
+}
+
+# Mount a folder in RAM for faster read/write access (tmpfs), sized from the available memory by default
+def mount_tmpfs(folder, size=None):
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    if not os.path.ismount(folder):
+        size = size or tmpfs_size()
+        print(f"Mounting {size} of RAM on {folder}")
+        subprocess.run(["sudo", "mount", "-t", "tmpfs", "-o", f"size={size}", "tmpfs", folder])
+
+# Unmount the folder from RAM after use
+def unmount_tmpfs(folder):
+    if os.path.ismount(folder):
+        subprocess.run(["sudo", "umount", folder])
+
+# Get the Raspberry Pi number from its hostname (used to differentiate devices)
+def get_raspberry_number():
+    hostname = socket.gethostname()
+    match = re.search(r'(\d+)$', hostname)
+    if match:
+        raspberry_number = int(match.group(1))
+    else:
+        raspberry_number = 253  # Default number if none is found
+    return raspberry_number
+
+# Busy-wait until the trigger time given by the server (nanoseconds since the epoch)
+def wait_until(capture_time):
+    while time.time_ns() < capture_time:
+        time.sleep(0.000001)
+
+# Remove the frames of a session from the RAM folder, keeping the mount
+def clear_folder(folder):
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file():
+                os.remove(entry.path)
+
+# Move frames the server never confirmed to the SD card so the next session cannot overwrite them
+def preserve_frames(folder, destination):
+    os.makedirs(destination, exist_ok=True)
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file():
+                shutil.move(entry.path, os.path.join(destination, entry.name))
+    print(f"The server did not confirm the extraction, images are kept in {destination}.")
+
+# Trigger id and trigger time (ns) of a TAKE_PHOTO command, count is the id when the server sends none
+def parse_take_photo(command, count):
+    fields = command.split()[1:]
+    if len(fields) == 1:
+        return count, int(fields[0])
+    return int(fields[0]), int(fields[1])
+
+# Save capture times and relative errors in long layout (camera, photo, time, error) for analysis,
+# with the skew of the exposure start from the trigger (s) and the exposure time (µs) of the frame metadata
+# The photo of a row is the trigger id of its frame, so a failed capture leaves a gap instead of shifting the
+# next rows against the other cameras; the trigger time lets the analysis check the rows are aligned
+def save_results_to_npz(filename, camera, capture_times, relative_errors, frames=()):
+    count = len(capture_times)
+    metadata = [frame for frame in frames if frame[0] > 3]  # The frames of capture_times, failed ones have no row
+    np.savez(filename,
+             camera=np.full(count, camera, dtype=np.int16),
+             photo=np.array([frame[1] for frame in metadata], dtype=np.int32),
+             trigger=np.array([frame[2] for frame in metadata], dtype=np.int64),
+             time=np.asarray(capture_times, dtype=np.float64),
+             error=np.asarray(relative_errors, dtype=np.float32) * 100,
+             skew=np.array([frame_skew(frame) for frame in metadata], dtype=np.float64),
+             exposure=np.array([np.nan if frame[5] is None else frame[5] for frame in metadata], dtype=np.float64))
+
+# Seconds from the trigger time to the exposure start of a frame, NaN without a sensor timestamp
+def frame_skew(frame):
+    _, _, trigger_time, exposure_start, _, _ = frame
+    return np.nan if exposure_start is None else (exposure_start - trigger_time) / 1e9
+
+# Per-frame metadata file, one line per frame taken: the photo count of the camera, the trigger id (the frame
+# number of the file name), the trigger time and the exposure start in nanoseconds since the epoch, the raw
+# sensor timestamp (boot-time clock) and the exposure time reported by the camera
+def save_frame_metadata(filename, frames):
+    with open(filename, 'w') as file:
+        file.write('photo,trigger_id,trigger_ns,exposure_start_ns,sensor_timestamp_ns,exposure_us\n')
+        for frame in frames:
+            file.write(','.join('' if value is None else str(value) for value in frame) + '\n')
+
+# Create a ZIP archive of the images of a folder
+def create_zip(folder, zip_filename):
+    with zipfile.ZipFile(zip_filename, 'w', zipfile.ZIP_STORED) as zipf:
+        for root, _, files in os.walk(folder):
+            for file in files:
+                file_path = os.path.join(root, file)
+                zipf.write(file_path, os.path.relpath(file_path, folder))
+
+# Send a file to the server using SCP (via SSH)
+def send_file_scp(filename, server_ip, remote_path):
+    ssh = paramiko.SSHClient()
+    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    try:
+        ssh.connect(server_ip, username=SERVER_USERNAME, password=SERVER_PASSWORD)
+        with SCPClient(ssh.get_transport()) as scp:
+            scp.put(filename, remote_path=remote_path)
+    finally:
+        ssh.close()
+
+# Control connection to the server, one message per line
+class ServerLink:
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = b''
+
+    def send(self, message):
+        self.sock.sendall(message.encode('utf-8') + b'\n')
+
+    # Next message from the server, None once the server closed the connection
+    def read_line(self):
+        while b'\n' not in self.buffer:
+            data = self.sock.recv(1024)
+            if not data:
+                return None
+            self.buffer += data
+        line, self.buffer = self.buffer.split(b'\n', 1)
+        return line.decode('utf-8').strip()
+
+    # Like read_line, but a closed connection ends the session
+    def expect_line(self):
+        line = self.read_line()
+        if line is None:
+            raise ConnectionError("The server closed the connection")
+        return line
+
+    def close(self):
+        self.sock.close()
+
+class CameraAgent:
+    # camera_factory builds the camera (Picamera2 by default, Fake_camera.FakeCamera off the rig).
+    # camera_number, source_ip and client_folder let several simulated agents share one machine.
+    def __init__(self, server_ip=SERVER_IP, port=PORT, ram_folder=ram_folder, system_setup=True, poll_interval=0.5,
+                 camera_factory=None, camera_number=None, source_ip=None, client_folder=None, monitor_interval=0.5,
+                 throttle_temp=THROTTLE_TEMP):
+        self.server_ip = server_ip
+        self.port = port
+        self.ram_folder = ram_folder
+        self.system_setup = system_setup  # tmpfs, NTP, CPU governor and cool-down, skipped when testing off the rig
+        self.poll_interval = poll_interval
+        self.raspberry_number = camera_number or get_raspberry_number()
+        self.source_ip = source_ip
+        self.client_folder = client_folder or f'/home/admin{self.raspberry_number}/Documents/Client'
+        self.camera = CameraManager(camera_factory)
+        self.monitor_interval = monitor_interval
+        self.monitor = None
+        self.throttle_temp = throttle_temp
+        self.capture_mode = 'file'
+        self.setup_seconds = None
+        self.sessions = 0
+
+    # One-time preparation, paid by the first session only.
+    # The setup time is counted from the process creation so it includes the interpreter and the imports.
+    def setup(self):
+        if self.system_setup:
+            mount_tmpfs(self.ram_folder)
+            os.system('sudo systemctl restart ntpsec')  # Restart NTP to synchronize time
+            time.sleep(2)
+            os.system(f'sudo ntpdate -b {self.server_ip}')  # Sync time with NTP server
+            os.system('sudo cpufreq-set -g performance')  # Set CPU to high-performance mode
+        # Sampled in the background, the capture loop only reads the cached values
+        self.monitor = ResourceMonitor(self.ram_folder, self.monitor_interval, RAM_THRESHOLD, TMPFS_THRESHOLD).start()
+        if self.system_setup:
+            self.monitor.wait_for_conditions(MAX_TEMP, MAX_CPU_USAGE)  # Wait for CPU to cool down
+        self.camera.open()
+        self.setup_seconds = time.time() - psutil.Process().create_time()
+        print(f"Agent ready after {self.setup_seconds:.2f} s")
+
+    # Connect to the server, polling until a session is listening
+    def connect(self):
+        source_address = (self.source_ip, 0) if self.source_ip else None
+        while True:
+            try:
+                sock = socket.create_connection((self.server_ip, self.port), timeout=self.poll_interval,
+                                                source_address=source_address)
+                sock.settimeout(None)
+                return ServerLink(sock)
+            except OSError:
+                time.sleep(self.poll_interval)
+
+    # Serve sessions until the agent is stopped, or the given number of sessions
+    def run(self, sessions=None):
+        self.setup()
+        while sessions is None or self.sessions < sessions:
+            link = self.connect()
+            try:
+                self.serve(link)
+            except (ConnectionError, OSError, ValueError) as e:
+                print(f"Session aborted: {e}")
+            finally:
+                link.close()
+
+    # Handshake, settings, then the capture commands of the requested mode
+    def serve(self, link):
+        _, mode, profile, transfer_mode = link.expect_line().split()
+        state = 'warm' if self.sessions else 'cold'
+        setup_seconds = 0.0 if self.sessions else self.setup_seconds
+        self.sessions += 1
+        tmpfs_bytes = shutil.disk_usage(self.ram_folder).total  # Sized from the memory at mount (tmpfs_size)
+        link.send(f'SESSION_READY {self.raspberry_number} {state} {setup_seconds:.3f} {tmpfs_bytes}')
+
+        _, width, height, exposure_time, *options = link.expect_line().split()
+        self.capture_mode = options[0] if options else 'file'
+        buffer_count = int(options[1]) if len(options) > 1 else 1
+        stream_format = 'YUV420' if self.capture_mode == 'raw' else 'BGR888'
+        self.camera.configure(int(width), int(height), int(exposure_time), CAMERA_PROFILES[profile], buffer_count,
+                              stream_format)
+        print(f"Capture mode {self.capture_mode}, {self.camera.buffer_count} buffer(s)")
+        link.send('CONFIGURED')
+
+        if mode == 'stereo':
+            self.stereo_session(link)
+        elif mode == 'timing_test':
+            self.timing_session(link)
+        else:
+            self.continuous_session(link, transfer_mode)
+
+    # Take a photo for every TAKE_PHOTO until STOP_RECORD or low memory
+    # Returns the capture times and the relative errors from the 4th photo on, the first ones warm the pipeline up,
+    # and the metadata of every frame taken as (photo, trigger id, trigger ns, exposure start ns, sensor timestamp,
+    # exposure µs)
+    # The storage manager gets every frame once it is written (once archived when there is an archiver)
+    def capture_frames(self, link, archiver=None, storage=None):
+        pool = EncodePool().start() if self.capture_mode in ('request', 'raw') else None
+        try:
+            return self.take_photos(link, archiver, storage, pool)
+        finally:
+            if pool:
+                pool.stop()  # Every frame is on tmpfs before the session goes on
+                print(pool.report())
+
+    # Capture loop of capture_frames; with an encode pool the frames are acknowledged before being written
+    def take_photos(self, link, archiver, storage, pool):
+        count = 1
+        capture_times = []
+        relative_errors = []
+        frames = []
+        detector = LatencyDetector()
+        thermal = ThermalController(self.monitor, throttle_temp=self.throttle_temp)
+        while True:
+            command = link.expect_line()
+            if command.startswith('TAKE_PHOTO'):
+                if self.monitor.low_memory:  # Last background sample of the RAM and tmpfs usage
+                    link.send('RAM_LOW')
+                    while link.expect_line() != 'STOP_RECORD':  # Skip a CADENCE sent meanwhile
+                        pass
+                    link.send('RECORDING_STOPPED')
+                    break
+
+                if archiver:
+                    archiver.hold()
+                if storage:
+                    storage.hold()
+                trigger_id, capture_time = parse_take_photo(command, count)
+                extension = RAW_EXTENSION if self.capture_mode == 'raw' else image_format
+                image_path = os.path.join(self.ram_folder, f"{image_prefix}{trigger_id}.{extension}")
+                wait_until(capture_time)
+                start_time = time.time()
+                try:
+                    if pool:
+                        save, metadata = self.camera.capture_request(raw=self.capture_mode == 'raw')
+                    else:
+                        metadata = self.camera.capture_file(image_path)
+                except RuntimeError as e:
+                    print(f"Capture of photo {trigger_id} failed: {e}")
+                    link.send(f'PHOTO_FAILED {trigger_id}')
+                    if archiver:
+                        archiver.release()
+                    if storage:
+                        storage.release()
+                    count += 1
+                    continue
+                capture_delay = time.time() - start_time
+                frames.append((count, trigger_id, capture_time, exposure_start_ns(metadata),
+                               metadata.get('SensorTimestamp'), metadata.get('ExposureTime')))
+
+                if count > 3:
+                    capture_times.append(capture_delay)
+                    for photo, relative_error, anomalous in detector.add(trigger_id, capture_delay):
+                        relative_errors.append(relative_error)
+                        if anomalous:
+                            link.send(f'ANOMALY {self.raspberry_number} {photo} {relative_error * 100:.2f}')
+                warning = thermal.record(capture_delay)
+                if warning:
+                    time_to_throttle, factor = warning
+                    seconds = '-' if time_to_throttle is None else f'{time_to_throttle:.1f}'
+                    print(f"Throttling predicted (in {seconds} s), asking for a {factor:.2f}x slower cadence")
+                    link.send(f'THROTTLE {self.raspberry_number} {seconds} {factor:.3f}')
+                link.send(f'PHOTO_TAKEN {trigger_id}')
+                on_written = archiver.add if archiver else storage.add if storage else None
+                if pool:
+                    pool.submit(save, image_path, on_written)
+                elif on_written:
+                    on_written(image_path)
+                if archiver:
+                    archiver.release()
+                if storage:
+                    storage.release()
+                count += 1
+
+            elif command.startswith('CADENCE'):
+                thermal.set_cadence(float(command.split()[1]))
+
+            elif command == 'STOP_RECORD':
+                link.send('RECORDING_STOPPED')
+                break
+        # Photos still in the warmup are compared with the median of the session
+        if detector.pending:
+            median = float(np.median([latency for _, latency in detector.pending]))
+            relative_errors.extend(abs(latency - median) / median for _, latency in detector.pending)
+        return capture_times, relative_errors, frames
+
+    # Speckle and checkerboard recording: frames stay in tmpfs until the server confirms the extraction
+    def continuous_session(self, link, transfer_mode):
+        zip_filename = os.path.join(self.client_folder, 'images.zip')
+        spill_folder = os.path.join(self.client_folder, 'spill')
+        os.makedirs(spill_folder, exist_ok=True)
+        archiver = None
+        extracted = False
+        if transfer_mode == 'scp':
+            # Frames already in the ZIP on the SD card only have to leave the RAM folder
+            storage = StorageManager(self.ram_folder, None, interval=self.monitor_interval).start()
+            archiver = IncrementalArchiver(zip_filename, self.ram_folder, storage.add)  # Build the ZIP between triggers
+        else:
+            storage = StorageManager(self.ram_folder, spill_folder, interval=self.monitor_interval).start()
+        try:
+            _, _, frames = self.capture_frames(link, archiver, storage)
+            storage.stop()
+            print(storage.report())
+            metadata_filename = os.path.join(self.ram_folder, f'metadata{self.raspberry_number}.csv')
+            save_frame_metadata(metadata_filename, frames)  # Sent or archived with the frames
+            if archiver:
+                archiver.add(metadata_filename)
+                archiver.finalize()  # Only the last frames are still to be archived
+                print(archiver.report())
+            link.send('READY')
+            if transfer_mode == 'sendfile':
+                extracted = serve_frame_requests(link, self.server_ip, self.ram_folder, source_ip=self.source_ip,
+                                                 spill_folder=spill_folder)
+            else:
+                extracted = link.read_line() == 'EXTRACTION_COMPLETE'
+        finally:
+            storage.stop()
+            if archiver:
+                archiver.finalize()
+            if extracted:
+                clear_folder(self.ram_folder)
+                clear_folder(spill_folder)
+                if os.path.exists(zip_filename):
+                    os.remove(zip_filename)
+            else:
+                destination = os.path.join(self.client_folder, f'unsent_{int(time.time())}')
+                preserve_frames(self.ram_folder, destination)
+                preserve_frames(spill_folder, destination)
+
+    # Timing test: only the capture times are kept, the server fetches the result file
+    def timing_session(self, link):
+        capture_times, relative_errors, frames = [], [], []
+        try:
+            capture_times, relative_errors, frames = self.capture_frames(link)
+        finally:
+            results_filename = os.path.join(self.client_folder, f'capture_results{self.raspberry_number}.npz')
+            save_results_to_npz(results_filename, self.raspberry_number, capture_times, relative_errors, frames)
+            clear_folder(self.ram_folder)
+            try:
+                link.send('RESULTS_SAVED')  # The server fetches the file once this arrives
+            except OSError:
+                pass
+
+    # Stereo pair: a single synchronized photo pushed to the server as a ZIP
+    def stereo_session(self, link):
+        image_folder = os.path.join(self.client_folder, 'Output_Image')
+        os.makedirs(image_folder, exist_ok=True)
+        image_path = os.path.join(image_folder, f"image_{self.raspberry_number}.jpg")
+        zip_filename = os.path.join(self.client_folder, f'images{self.raspberry_number}.zip')
+        try:
+            command = link.expect_line()
+            if command.startswith('TAKE_PHOTO'):
+                trigger_id, capture_time = parse_take_photo(command, 1)
+                wait_until(capture_time)
+                self.camera.capture_file(image_path)
+                link.send(f'PHOTO_TAKEN {trigger_id}')
+
+            if link.expect_line() == 'STOP_RECORD':
+                link.send('RECORDING_STOPPED')
+                create_zip(image_folder, zip_filename)
+                send_file_scp(zip_filename, self.server_ip, '/home/admin/Documents/Server/Stereo/')
+        finally:
+            for path in (zip_filename, image_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    # Release the camera and the RAM folder
+    def shutdown(self):
+        if self.monitor:
+            self.monitor.stop()
+        self.camera.close()
+        unmount_tmpfs(self.ram_folder)
+
+# Serve a single session then release everything, the way the per-mode client scripts used to run
+def run_single(server_ip=SERVER_IP, port=PORT):
+    agent = CameraAgent(server_ip, port)
+    agent.setup()
+    link = agent.connect()
+    try:
+        agent.serve(link)
+    finally:
+        link.close()
+        agent.shutdown()
+
+if __name__ == '__main__':
+    os.nice(-20)  # Set high priority for the process
+    CameraAgent().run()
@@ -0,0 +1,162 @@
+import time
+import threading
+from Resource_monitor import read_cma
+from Raw_frame import write_raw_frame
+
+try:
+    from picamera2 import Picamera2
+except ImportError:  # Off the Pi only the fake camera (Fake_camera.py) can be used
+    Picamera2 = None
+
+JPEG_QUALITY = 90  # Quality picamera2 encodes with in capture_file
+BUFFER_BYTES_PER_PIXEL = 5       # BGR888 main stream and 16-bit unpacked raw stream of a still configuration
+CMA_SHARE = 0.6                  # Share of the CMA area left to the capture buffers (ISP and display use the rest)
+DEFAULT_BUFFER_BUDGET = 256 * 1024 ** 2
+MAX_BUFFERS = 8
+
+# Memory the capture buffers may take, from the CMA area when the kernel reports it
+def buffer_budget():
+    total, _ = read_cma()
+    return int(total * CMA_SHARE) if total else DEFAULT_BUFFER_BUDGET
+
+# Number of buffers of a resolution that fit in the memory budget, at least one
+def buffer_count_for(width, height, budget=None, max_buffers=MAX_BUFFERS):
+    budget = buffer_budget() if budget is None else budget
+    return max(1, min(max_buffers, int(budget // (width * height * BUFFER_BYTES_PER_PIXEL))))
+
+# Exposure start of a frame in nanoseconds since the epoch, from the metadata of its request, None without it.
+# SensorTimestamp is the boot-time clock when the sensor started reading the frame out; the first row was
+# exposed ExposureTime µs before. The boot-time clock is moved to the NTP-disciplined epoch clock so that
+# the exposure starts of different cameras can be compared with each other and with the trigger time.
+def exposure_start_ns(metadata):
+    if not metadata or 'SensorTimestamp' not in metadata:
+        return None
+    boot_offset = time.time_ns() - time.clock_gettime_ns(time.CLOCK_BOOTTIME)
+    return metadata['SensorTimestamp'] - int(metadata.get('ExposureTime', 0)) * 1000 + boot_offset
+
+# Keeps one camera open for the whole process and switches settings without tearing it down.
+# Still configurations are built once per (width, height, buffer count, pixel format) and reused; a
+# resolution or stream change only stops, reconfigures and restarts the running camera, controls such as
+# ExposureTime are set in place. The main stream is BGR888 for JPEG captures, YUV420 for raw frames.
+# With more than one buffer, capture_request keeps up to buffer_count - 1 requests until they are saved,
+# so the encoding reads the camera buffer directly while the camera fills the next one; each extra buffer
+# costs BUFFER_BYTES_PER_PIXEL bytes per pixel of CMA memory. With one buffer the frame is copied out.
+class CameraManager:
+    def __init__(self, camera_factory=None, buffer_count=1):
+        self.camera_factory = camera_factory or Picamera2
+        self.buffer_count = buffer_count
+        self.camera = None
+        self.configs = {}
+        self.size = None
+        self.configured_buffers = None
+        self.stream_format = None
+        self.controls = {}
+        self.held = 0  # Requests handed out by capture_request and not saved yet
+        self.lock = threading.Lock()
+        self.switch_times = []  # (kind, seconds) for every configure call: 'open', 'resolution', 'stream' or 'controls'
+
+    def open(self):
+        if self.camera is None:
+            if self.camera_factory is None:
+                raise RuntimeError("picamera2 is not installed, use the fake camera backend")
+            self.camera = self.camera_factory()
+
+    # Prebuilt still configuration for a resolution, a number of buffers and a pixel format
+    def still_configuration(self, width, height, buffer_count, stream_format):
+        key = (width, height, buffer_count, stream_format)
+        if key not in self.configs:
+            self.configs[key] = self.camera.create_still_configuration(
+                main={"size": (width, height), "format": stream_format}, buffer_count=buffer_count)
+        return self.configs[key]
+
+    # Apply a resolution, an exposure time and the other controls, doing only what changed
+    # buffer_count=None keeps the current number of buffers, 0 sizes it from the memory budget
+    def configure(self, width, height, exposure_time, controls=None, buffer_count=None, stream_format='BGR888'):
+        start_time = time.perf_counter()
+        kind = 'controls'
+        if buffer_count is not None:
+            self.buffer_count = buffer_count or buffer_count_for(width, height)
+        if self.camera is None:
+            self.open()
+            kind = 'open'
+        if (self.size != (width, height) or self.configured_buffers != self.buffer_count
+                or self.stream_format != stream_format):
+            if self.camera.started:
+                self.camera.stop()
+            self.camera.configure(self.still_configuration(width, height, self.buffer_count, stream_format))
+            if kind == 'controls':
+                kind = 'resolution' if self.size != (width, height) else 'stream'
+            self.size = (width, height)
+            self.configured_buffers = self.buffer_count
+            self.stream_format = stream_format
+            self.controls = {}  # A new configuration starts from the default controls
+
+        requested = dict(controls or {}, ExposureTime=exposure_time)
+        changed = {name: value for name, value in requested.items() if self.controls.get(name) != value}
+        if changed:
+            self.camera.set_controls(changed)
+            self.controls.update(changed)
+        if not self.camera.started:
+            self.camera.start()
+        self.switch_times.append((kind, time.perf_counter() - start_time))
+
+    # Capture an image and save it to the specified path, returns the request metadata of the frame
+    # (SensorTimestamp, ExposureTime, FrameDuration, ...)
+    def capture_file(self, image_path):
+        return self.camera.capture_file(image_path) or {}
+
+    # Capture without encoding. Returns save(path), which encodes and writes the JPEG later (raw=True: writes
+    # the YUV420 buffer as a raw frame), and the request metadata. The request is kept until then while a
+    # spare buffer is left to the camera, otherwise the frame is copied out and the buffer goes straight back.
+    def capture_request(self, raw=False):
+        request = self.camera.capture_request()
+        metadata = request.get_metadata() or {}
+        with self.lock:
+            hold = self.held < self.buffer_count - 1
+            if hold:
+                self.held += 1
+        if hold:
+            return lambda image_path: self.save_request(request, image_path, raw), metadata
+        try:
+            image = request.make_buffer('main') if raw else request.make_image('main')
+        finally:
+            request.release()
+        if raw:
+            return lambda image_path: self.write_raw(image, image_path), metadata
+        return lambda image_path: image.save(image_path, quality=JPEG_QUALITY), metadata
+
+    # Encode a kept request straight from its buffer and give the buffer back
+    def save_request(self, request, image_path, raw=False):
+        try:
+            if raw:
+                self.write_raw(request.make_buffer('main'), image_path)
+            else:
+                request.save('main', image_path)
+        finally:
+            request.release()
+            with self.lock:
+                self.held -= 1
+
+    # Write a copy of the main stream buffer with the geometry of the current configuration
+    def write_raw(self, buffer, image_path):
+        stream = self.camera.camera_configuration()['main']
+        width, height = stream['size']
+        write_raw_frame(image_path, buffer, width, height, stream['stride'], self.stream_format)
+
+    def close(self):
+        if self.camera is not None:
+            if self.camera.started:
+                self.camera.stop()
+            self.camera.close()
+            self.camera = None
+            self.size = None
+            self.configured_buffers = None
+            self.stream_format = None
+            self.controls = {}
+
+    # Mean switching time per kind of change
+    def report(self):
+        kinds = {}
+        for kind, seconds in self.switch_times:
+            kinds.setdefault(kind, []).append(seconds)
+        return {kind: sum(times) / len(times) for kind, times in kinds.items()}
@@ -0,0 +1,82 @@
+import os
+import time
+import queue
+import threading
+
+# Encodes and writes the frames taken with capture_request on a pool of threads, one per core by default,
+# so a frame is acknowledged as soon as the sensor has delivered it instead of after the JPEG is on tmpfs.
+# Pillow's JPEG encoder and the file writes release the GIL, the workers encode in parallel.
+# The queue is bounded: when the encoding falls behind, submit() blocks and the acknowledgment is delayed
+# rather than the frames piling up in RAM. on_written(path) is called once a frame is complete (archiver
+# or storage manager). The queue depth is sampled at every submit.
+class EncodePool:
+    def __init__(self, workers=None, max_queue=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue = queue.Queue(max_queue or 2 * self.workers)
+        self.threads = []
+        self.lock = threading.Lock()
+        self.depths = []
+        self.encode_times = []
+        self.encoded_bytes = 0
+        self.failures = 0
+        self.first_submit = None
+        self.last_written = None
+
+    def start(self):
+        self.threads = [threading.Thread(target=self.run, daemon=True) for _ in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    # Queue a frame: save(path) encodes and writes it
+    def submit(self, save, path, on_written=None):
+        if self.first_submit is None:
+            self.first_submit = time.perf_counter()
+        self.depths.append(self.queue.qsize())
+        self.queue.put((save, path, on_written))
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+            save, path, on_written = item
+            start_time = time.perf_counter()
+            try:
+                save(path)
+            except (RuntimeError, OSError) as e:
+                print(f"Encoding of {os.path.basename(path)} failed: {e}")
+                with self.lock:
+                    self.failures += 1
+            else:
+                with self.lock:
+                    self.encode_times.append(time.perf_counter() - start_time)
+                    self.encoded_bytes += os.path.getsize(path)
+                    self.last_written = time.perf_counter()
+                if on_written:
+                    on_written(path)
+            finally:
+                self.queue.task_done()
+
+    # Wait until every queued frame is written
+    def drain(self):
+        self.queue.join()
+
+    def stop(self):
+        self.drain()
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def report(self):
+        if not self.encode_times:
+            return "Encoding: no frames encoded."
+        count = len(self.encode_times)
+        elapsed = (self.last_written - self.first_submit) or 1e-9
+        return (f"Encoding: {count} frames on {self.workers} workers, {count / elapsed:.2f} frames/s "
+                f"({self.encoded_bytes / elapsed / 1e6:.1f} MB/s), encode mean {sum(self.encode_times) / count * 1000:.1f} ms, "
+                f"queue depth mean {sum(self.depths) / len(self.depths):.1f} / max {max(self.depths)}"
+                + (f", {self.failures} failed" if self.failures else ""))
@@ -0,0 +1,223 @@
+import os
+import time
+import random
+import threading
+
+# Stand-in for Picamera2 with the subset of its API used by the clients, for running and
+# benchmarking the capture code without a camera. Every call sleeps for a cost modelled on
+# the HQ camera: creating the camera and configuring a stream are expensive, controls are cheap
+# and a capture grows with the pixel count and the exposure time. Captures return the request metadata
+# Picamera2 does, with a SensorTimestamp on the boot-time clock. encode_share is the part of the
+# per-pixel cost spent encoding and writing the JPEG, which capture_request leaves to the caller.
+# capture_request waits for a free buffer while all the buffers of the configuration are held by
+# unreleased requests; copying a frame out of its request costs copy_seconds_per_megapixel.
+class FakeCamera:
+    def __init__(self, open_time=0.5, configure_time=0.25, start_time=0.1, stop_time=0.05,
+                 controls_time=0.001, capture_overhead=0.03, seconds_per_megapixel=0.02, jpeg_bytes_per_pixel=0.3,
+                 encode_share=0.6, copy_seconds_per_megapixel=0.003):
+        self.configure_time = configure_time
+        self.start_time = start_time
+        self.stop_time = stop_time
+        self.controls_time = controls_time
+        self.capture_overhead = capture_overhead
+        self.seconds_per_megapixel = seconds_per_megapixel
+        self.jpeg_bytes_per_pixel = jpeg_bytes_per_pixel
+        self.encode_share = encode_share
+        self.copy_seconds_per_megapixel = copy_seconds_per_megapixel
+        self.buffers = threading.Condition()
+        self.held = 0
+        self.started = False
+        self.camera_config = None
+        self.controls = {}
+        time.sleep(open_time)
+
+    def create_still_configuration(self, main=None, buffer_count=1):
+        main = dict({"size": (4056, 3040), "format": "BGR888"}, **(main or {}))
+        return {"main": main, "buffer_count": buffer_count}
+
+    def configure(self, camera_config):
+        if self.started:
+            raise RuntimeError("Camera must be stopped before configuring")
+        time.sleep(self.configure_time)
+        self.camera_config = camera_config
+        self.controls = {}
+
+    # Configuration with the stride of the main stream filled in, rows aligned on 64 bytes like libcamera does
+    def camera_configuration(self):
+        width, _ = self.camera_config["main"]["size"]
+        bytes_per_pixel = 1 if self.camera_config["main"]["format"] == "YUV420" else 3
+        return dict(self.camera_config, main=dict(self.camera_config["main"], stride=(width * bytes_per_pixel + 63) // 64 * 64))
+
+    def set_controls(self, controls):
+        time.sleep(self.controls_time)
+        self.controls.update(controls)
+
+    def start(self):
+        if self.camera_config is None:
+            raise RuntimeError("Camera has not been configured")
+        time.sleep(self.start_time)
+        self.started = True
+
+    def stop(self):
+        if self.started:
+            time.sleep(self.stop_time)
+        self.started = False
+
+    def close(self):
+        self.stop()
+
+    # Duration of one capture for the current configuration
+    def capture_duration(self):
+        width, height = self.camera_config["main"]["size"]
+        exposure = self.controls.get("ExposureTime", 10000) / 1e6
+        return self.capture_overhead + width * height / 1e6 * self.seconds_per_megapixel + exposure
+
+    # Seconds from the capture call to the start of the exposure
+    def exposure_delay(self):
+        return self.capture_overhead
+
+    # Size in bytes of the JPEG written for the current configuration
+    def frame_size(self):
+        width, height = self.camera_config["main"]["size"]
+        return max(int(width * height * self.jpeg_bytes_per_pixel), 4)
+
+    # Exposure and readout of one frame; returns its request metadata and the encoding time still to spend
+    def grab(self):
+        if not self.started:
+            raise RuntimeError("Camera is not started")
+        called = time.clock_gettime_ns(time.CLOCK_BOOTTIME)
+        exposure = self.controls.get("ExposureTime", 10000)
+        exposure_delay = self.exposure_delay()
+        duration = self.capture_duration()
+        width, height = self.camera_config["main"]["size"]
+        encode_time = (width * height / 1e6 * self.seconds_per_megapixel * self.encode_share
+                       * duration / FakeCamera.capture_duration(self))  # Same jitter as the whole capture
+        time.sleep(duration - encode_time)
+        # The readout starts once the exposure of the first row is over
+        metadata = {
+            "SensorTimestamp": called + int(exposure_delay * 1e9) + exposure * 1000,
+            "ExposureTime": exposure,
+            "FrameDuration": int(duration * 1e6),
+        }
+        return metadata, encode_time
+
+    # Write a file with JPEG start and end markers and a size proportional to the pixel count
+    def write_jpeg(self, image_path, encode_time):
+        time.sleep(encode_time)
+        payload_size = self.frame_size()
+        with open(image_path, 'wb') as file:
+            file.write(b'\xff\xd8')
+            file.write(os.urandom(64))
+            file.truncate(payload_size - 2)
+            file.seek(payload_size - 2)
+            file.write(b'\xff\xd9')
+
+    def capture_file(self, image_path):
+        metadata, encode_time = self.grab()
+        self.write_jpeg(image_path, encode_time)
+        return metadata
+
+    def capture_request(self):
+        with self.buffers:
+            self.buffers.wait_for(lambda: self.held < self.camera_config["buffer_count"])
+            self.held += 1
+        try:
+            metadata, encode_time = self.grab()
+        except RuntimeError:
+            self.release_buffer()
+            raise
+        return FakeRequest(self, metadata, encode_time)
+
+    def release_buffer(self):
+        with self.buffers:
+            self.held -= 1
+            self.buffers.notify()
+
+# Completed request of the fake camera: the frame is only encoded when it is saved
+class FakeRequest:
+    def __init__(self, camera, metadata, encode_time):
+        self.camera = camera
+        self.metadata = metadata
+        self.encode_time = encode_time
+
+    def get_metadata(self):
+        return dict(self.metadata)
+
+    # Copy of the frame out of the request buffer, saved as a JPEG like a PIL image
+    def make_image(self, name):
+        width, height = self.camera.camera_config["main"]["size"]
+        time.sleep(width * height / 1e6 * self.camera.copy_seconds_per_megapixel)
+        return FakeImage(self.camera, self.encode_time)
+
+    # Copy of the stream buffer as bytes (the Y, U and V planes for YUV420)
+    def make_buffer(self, name):
+        stream = self.camera.camera_configuration()["main"]
+        width, height = stream["size"]
+        time.sleep(width * height / 1e6 * self.camera.copy_seconds_per_megapixel)
+        rows = height * 3 // 2 if stream["format"] == "YUV420" else height
+        return bytes(stream["stride"] * rows)
+
+    def save(self, name, image_path):
+        self.camera.write_jpeg(image_path, self.encode_time)
+
+    def release(self):
+        self.camera.release_buffer()
+
+class FakeImage:
+    def __init__(self, camera, encode_time):
+        self.camera = camera
+        self.encode_time = encode_time
+
+    def save(self, image_path, quality=None):
+        self.camera.write_jpeg(image_path, self.encode_time)
+
+# Fake camera with a random capture latency, random JPEG sizes and injected failures, for load tests.
+# latency is 'normal' or 'lognormal' around the FakeCamera duration with a relative spread of jitter;
+# with spike_probability a capture takes spike_factor times longer (SD card stall, thermal throttling);
+# with failure_probability a capture raises RuntimeError like a camera timeout does.
+# The exposure starts anywhere in the frame period after the call (the sensor keeps streaming), which
+# spreads the exposure starts of cameras triggered at the same time.
+# The start time of every capture is kept in capture_starts (nanoseconds since the epoch).
+class SimulatedCamera(FakeCamera):
+    def __init__(self, seed=None, latency='normal', jitter=0.02, spike_probability=0.0, spike_factor=3.0,
+                 size_jitter=0.1, failure_probability=0.0, **costs):
+        super().__init__(**costs)
+        self.rng = random.Random(seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.spike_probability = spike_probability
+        self.spike_factor = spike_factor
+        self.size_jitter = size_jitter
+        self.failure_probability = failure_probability
+        self.capture_starts = []
+        self.failures = 0
+
+    def capture_duration(self):
+        duration = super().capture_duration()
+        if self.latency == 'lognormal':
+            duration *= self.rng.lognormvariate(0.0, self.jitter)
+        else:
+            duration *= max(self.rng.gauss(1.0, self.jitter), 0.0)
+        if self.rng.random() < self.spike_probability:
+            duration *= self.spike_factor
+        return duration
+
+    def exposure_delay(self):
+        return self.rng.uniform(0.0, 2 * self.capture_overhead)
+
+    def frame_size(self):
+        return max(int(super().frame_size() * max(self.rng.gauss(1.0, self.size_jitter), 0.1)), 4)
+
+    def capture_file(self, image_path):
+        self.capture_starts.append(time.time_ns())
+        if self.rng.random() < self.failure_probability:
+            self.failures += 1
+            raise RuntimeError("Simulated capture failure")
+        return super().capture_file(image_path)
+
+    def capture_request(self):
+        self.capture_starts.append(time.time_ns())
+        if self.rng.random() < self.failure_probability:
+            self.failures += 1
+            raise RuntimeError("Simulated capture failure")
+        return super().capture_request()
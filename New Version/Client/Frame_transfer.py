@@ -0,0 +1,82 @@
+import os
+import re
+import socket
+import struct
+
+# Indexed frame container sent to the server instead of a ZIP archive.
+# Layout: header, one index entry per frame, then the raw frame bytes back to back.
+# Offsets in the index are absolute positions inside the container.
+CONTAINER_MAGIC = b'CRPF'
+CONTAINER_VERSION = 1
+HEADER_FORMAT = '<4sHI'   # magic, version, frame count
+ENTRY_FORMAT = '<QQH'     # frame offset, frame size, name length (name bytes follow)
+
+TRANSFER_PORT = 5001
+
+# Sort key keeping img2 before img10
+def natural_key(name):
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', name)]
+
+# List the frames of one or more folders as (name, path, size) with a single scan of each folder
+def list_frames(*folders):
+    frames = []
+    for folder in folders:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    frames.append((entry.name, entry.path, entry.stat().st_size))
+    frames.sort(key=lambda frame: natural_key(frame[0]))
+    return frames
+
+# Build the container header and index for the given frames
+def build_container_header(frames):
+    names = [name.encode('utf-8') for name, _, _ in frames]
+    index_size = sum(struct.calcsize(ENTRY_FORMAT) + len(name) for name in names)
+    offset = struct.calcsize(HEADER_FORMAT) + index_size
+
+    header = [struct.pack(HEADER_FORMAT, CONTAINER_MAGIC, CONTAINER_VERSION, len(frames))]
+    for name, (_, _, size) in zip(names, frames):
+        header.append(struct.pack(ENTRY_FORMAT, offset, size, len(name)) + name)
+        offset += size
+    return b''.join(header)
+
+# Stream the frames of the folders as a container; the frame bytes go through sendfile
+# straight from the page cache (tmpfs) to the socket without passing through Python
+def send_container(sock, *folders):
+    frames = list_frames(*folders)
+    header = build_container_header(frames)
+    sock.sendall(header)
+    total_bytes = len(header)
+    for _, path, size in frames:
+        with open(path, 'rb') as file:
+            total_bytes += sock.sendfile(file, 0, size)
+    return total_bytes
+
+# Open a data connection to the server and send every frame of the folder
+# source_ip picks the local address the server identifies the camera by (simulated cameras on loopback)
+# spill_folder holds the older frames the storage manager moved to the SD card, sent in the same container
+def send_frames(server_ip, folder, port=TRANSFER_PORT, source_ip=None, spill_folder=None):
+    source_address = (source_ip, 0) if source_ip else None
+    folders = [folder, spill_folder] if spill_folder else [folder]
+    with socket.create_connection((server_ip, port), source_address=source_address) as sock:
+        total_bytes = send_container(sock, *folders)
+        sock.shutdown(socket.SHUT_WR)
+        # Wait for the server to close its side so that the data is known to be received
+        sock.recv(1)
+    return total_bytes
+
+# Send the frames each time the server asks for them until it confirms the extraction.
+# control_link reads the server messages line by line (Camera_agent.ServerLink).
+# Returns False if the server closed the connection first; the frames must then be kept.
+def serve_frame_requests(control_link, server_ip, folder, port=TRANSFER_PORT, source_ip=None, spill_folder=None):
+    while True:
+        command = control_link.read_line()
+        if command is None:
+            return False
+        if command == 'EXTRACTION_COMPLETE':
+            return True
+        if command == 'SEND_FRAMES':
+            try:
+                send_frames(server_ip, folder, port, source_ip, spill_folder)  # Zero-copy transfer straight from tmpfs
+            except OSError as e:
+                print(f"Error sending frames: {e}")
@@ -0,0 +1,97 @@
+import os
+import queue
+import threading
+import time
+import zipfile
+
+CHUNK_SIZE = 256 * 1024
+
+# Appends frames to an open ZIP archive in the background while the capture is running.
+# The capture loop holds the archiver while a photo is being taken. Frames are copied in chunks
+# under a lock that hold() also takes, so once hold() returns nothing is written until release():
+# the archive is only written in the gaps between triggers and is almost complete at STOP_RECORD.
+# on_archived(path) is called for every frame once it is in the archive.
+class IncrementalArchiver:
+    def __init__(self, zip_filename, base_folder, on_archived=None):
+        self.zip_filename = zip_filename
+        self.base_folder = base_folder
+        self.on_archived = on_archived
+        self.zipf = zipfile.ZipFile(zip_filename, 'w', zipfile.ZIP_STORED)
+        self.pending = queue.Queue()
+        self.idle = threading.Event()
+        self.idle.set()
+        self.lock = threading.Lock()
+        self.append_times = []
+        self.archived_bytes = 0
+        self.finalize_time = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    # Queue a frame that has just been written
+    def add(self, path):
+        self.pending.put(path)
+
+    # Pause archiving while a photo is being taken; returns once the chunk in progress, if any, is written
+    def hold(self):
+        self.idle.clear()
+        with self.lock:
+            pass
+
+    # Resume archiving once the photo is acknowledged
+    def release(self):
+        self.idle.set()
+
+    def run(self):
+        while True:
+            path = self.pending.get()
+            if path is None:
+                break
+            self.append_times.append(self.append(path))
+            self.archived_bytes += os.path.getsize(path)
+            if self.on_archived:
+                self.on_archived(path)
+
+    # Copy one frame into the archive chunk by chunk, only while the archiver is not held
+    # Returns the time spent writing, waits excluded
+    def append(self, path):
+        write_time = 0.0
+        info = zipfile.ZipInfo.from_file(path, os.path.relpath(path, self.base_folder))
+        info.compress_type = zipfile.ZIP_STORED
+        with open(path, 'rb') as source, self.zipf.open(info, 'w') as target:
+            while True:
+                self.idle.wait()
+                with self.lock:
+                    if not self.idle.is_set():
+                        continue
+                    start_time = time.perf_counter()
+                    chunk = source.read(CHUNK_SIZE)
+                    if chunk:
+                        target.write(chunk)
+                    write_time += time.perf_counter() - start_time
+                if not chunk:
+                    break
+        return write_time
+
+    # Archive the frames still in the queue and close the ZIP file
+    def finalize(self):
+        if self.finalize_time is not None:
+            return self.finalize_time
+        start_time = time.perf_counter()
+        self.release()
+        self.pending.put(None)
+        self.thread.join()
+        self.zipf.close()
+        self.finalize_time = time.perf_counter() - start_time
+        return self.finalize_time
+
+    # Summary of the per-file archiving overhead and the finalization time
+    def report(self):
+        if not self.append_times:
+            return "Archive: no frames archived."
+        count = len(self.append_times)
+        mean_ms = sum(self.append_times) / count * 1000
+        max_ms = max(self.append_times) * 1000
+        finalize_ms = (self.finalize_time or 0.0) * 1000
+        return (f"Archive: {count} frames, {self.archived_bytes / 1e6:.1f} MB, "
+                f"per-file overhead mean {mean_ms:.2f} ms / max {max_ms:.2f} ms, "
+                f"finalization {finalize_ms:.2f} ms")
@@ -0,0 +1,47 @@
+import math
+import numpy as np
+
+# Streaming capture-latency anomaly detector with constant memory, replacing the comparison with the
+# latency of the third photo. The first warmup latencies give a robust start (median and MAD), then an
+# exponentially weighted mean and variance follow the latency in O(1) per frame. A frame is anomalous
+# when it is more than threshold standard deviations away from the mean; the deviation is clipped to
+# that bound before updating the statistics, so a spike barely moves them while a lasting shift is
+# followed. The standard deviation has a floor of min_deviation / threshold of the mean, so on a very
+# steady camera nothing below min_deviation (the former 6% rule) is flagged.
+class LatencyDetector:
+    def __init__(self, alpha=0.05, threshold=4.0, min_deviation=0.06, warmup=8):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.min_deviation = min_deviation
+        self.warmup = warmup
+        self.pending = []  # (photo, latency) until the warmup is complete
+        self.mean = None
+        self.variance = None
+
+    def std(self):
+        return max(math.sqrt(self.variance), self.min_deviation * self.mean / self.threshold)
+
+    # Add the latency of a photo, return the photos classified by this call as (photo, relative error, anomalous):
+    # nothing during the warmup, every warmup photo when it completes, then the given photo
+    def add(self, photo, latency):
+        if self.mean is None:
+            self.pending.append((photo, latency))
+            if len(self.pending) < self.warmup:
+                return []
+            latencies = np.array([latency for _, latency in self.pending])
+            self.mean = float(np.median(latencies))
+            self.variance = float(1.4826 * np.median(np.abs(latencies - self.mean))) ** 2
+            pending, self.pending = self.pending, []
+            return [self.classify(photo, latency, update=False) for photo, latency in pending]
+        return [self.classify(photo, latency)]
+
+    def classify(self, photo, latency, update=True):
+        deviation = latency - self.mean
+        bound = self.threshold * self.std()
+        anomalous = abs(deviation) > bound
+        relative_error = abs(deviation) / self.mean
+        if update:
+            deviation = min(max(deviation, -bound), bound)
+            self.mean += self.alpha * deviation
+            self.variance = (1 - self.alpha) * (self.variance + self.alpha * deviation ** 2)
+        return photo, relative_error, anomalous
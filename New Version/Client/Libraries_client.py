@@ -16,6 +16,7 @@ def main():
         "sudo apt install ntp -y",
         "sudo apt install ntpdate -y",
         "sudo apt install python3-pandas -y",
+        "sudo apt install python3-numpy -y",
         "sudo apt install python3-ntplib -y",
         "sudo apt-get install cpufrequtils -y",
         "sudo apt install dhcpcd5 -y"
@@ -0,0 +1,113 @@
+import os
+import time
+import threading
+
+THERMAL_ZONE = '/sys/class/thermal/thermal_zone0/temp'
+
+# Samples CPU temperature, CPU usage, RAM and tmpfs usage on a background thread.
+# The values are read straight from /sys and /proc (no vcgencmd or top subprocess) and kept as
+# plain attributes, so the capture loop reads the last sample without any system call.
+class ResourceMonitor:
+    def __init__(self, folder=None, interval=1.0, ram_threshold=90.0, tmpfs_threshold=90.0):
+        self.folder = folder  # tmpfs folder whose usage is tracked, None to skip it
+        self.interval = interval
+        self.ram_threshold = ram_threshold
+        self.tmpfs_threshold = tmpfs_threshold
+        self.cpu_temp = None       # °C, None when the board has no thermal zone
+        self.cpu_usage = 0.0       # % of all cores since the previous sample
+        self.ram_usage = 0.0       # % of MemTotal not available
+        self.ram_available = 0     # bytes
+        self.tmpfs_usage = 0.0     # % of the tmpfs folder used
+        self.tmpfs_free = 0        # bytes
+        self.low_memory = False    # RAM or tmpfs above its threshold
+        self.sampled_at = None
+        self.previous_cpu = None
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.sample()
+
+    def start(self):
+        if self.thread is None:
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    # Take a new sample of every value
+    def sample(self):
+        self.cpu_temp = read_cpu_temp()
+        self.cpu_usage = self.read_cpu_usage()
+        self.ram_usage, self.ram_available = read_memory()
+        if self.folder:
+            self.tmpfs_usage, self.tmpfs_free = read_disk_usage(self.folder)
+        self.low_memory = self.ram_usage > self.ram_threshold or self.tmpfs_usage > self.tmpfs_threshold
+        self.sampled_at = time.time()
+
+    # CPU usage since the previous sample from the aggregate line of /proc/stat
+    def read_cpu_usage(self):
+        with open('/proc/stat') as file:
+            values = [int(value) for value in file.readline().split()[1:]]
+        idle = values[3] + values[4]  # idle + iowait
+        total = sum(values[:8])       # guest time is already counted in user time
+        previous, self.previous_cpu = self.previous_cpu, (idle, total)
+        if previous is None or total == previous[1]:
+            return self.cpu_usage
+        return 100.0 * (1.0 - (idle - previous[0]) / (total - previous[1]))
+
+    # Block until the temperature and the CPU usage are below the limits
+    def wait_for_conditions(self, max_temp, max_cpu_usage):
+        while True:
+            if self.thread is None:
+                self.sample()
+            too_hot = self.cpu_temp is not None and self.cpu_temp > max_temp
+            if not too_hot and self.cpu_usage <= max_cpu_usage:
+                return
+            time.sleep(self.interval)
+
+# CPU temperature in °C, None if the thermal zone does not exist
+def read_cpu_temp():
+    try:
+        with open(THERMAL_ZONE) as file:
+            return int(file.read()) / 1000.0
+    except (OSError, ValueError):
+        return None
+
+# Fields of /proc/meminfo in bytes
+def read_meminfo():
+    fields = {}
+    with open('/proc/meminfo') as file:
+        for line in file:
+            name, value = line.split(':', 1)
+            fields[name] = int(value.split()[0]) * 1024
+    return fields
+
+# RAM usage in % and available bytes from /proc/meminfo
+def read_memory():
+    fields = read_meminfo()
+    total = fields['MemTotal']
+    available = fields.get('MemAvailable', fields['MemFree'])
+    return 100.0 * (total - available) / total, available
+
+# Total and free bytes of the contiguous memory area the camera buffers are allocated from, 0 without CMA
+def read_cma():
+    fields = read_meminfo()
+    return fields.get('CmaTotal', 0), fields.get('CmaFree', 0)
+
+# Usage in % and free bytes of the filesystem holding a folder
+def read_disk_usage(folder):
+    stats = os.statvfs(folder)
+    total = stats.f_blocks * stats.f_frsize
+    free = stats.f_bavail * stats.f_frsize
+    if not total:
+        return 0.0, free
+    return 100.0 * (total - free) / total, free
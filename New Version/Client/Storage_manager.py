@@ -0,0 +1,113 @@
+import os
+import time
+import threading
+from collections import deque
+from Resource_monitor import read_memory, read_disk_usage
+
+SPILL_HIGH_WATER = 70.0  # tmpfs usage (%) above which the oldest frames leave the RAM folder
+SPILL_LOW_WATER = 50.0   # tmpfs usage (%) the spilling brings the folder back to
+CHUNK_SIZE = 1024 * 1024
+MIN_SD_FREE = 512 * 1024 ** 2  # Free space left on the SD card before spilling stops
+
+# Size of the tmpfs mount from the memory currently available instead of a fixed "2G":
+# a share of MemAvailable once a reserve for the camera buffers and the agent is set aside
+def tmpfs_size(reserve=512 * 1024 ** 2, fraction=0.75):
+    _, available = read_memory()
+    size = max(int((available - reserve) * fraction), 64 * 1024 ** 2)
+    return f"{size // 1024 ** 2}M"
+
+# Keeps the tmpfs folder below its high-water mark during long sessions so the capture never has to stop
+# on RAM_LOW. Frames handed over with add() (written, and archived in ZIP mode) are moved oldest first to
+# the SD card, or only removed when spill_folder is None because a copy is already on the SD card (ZIP).
+# Like the archiver, the copy runs in chunks between triggers only: hold() pauses it during a capture.
+class StorageManager:
+    def __init__(self, ram_folder, spill_folder=None, high_water=SPILL_HIGH_WATER, low_water=SPILL_LOW_WATER,
+                 interval=0.5, min_free=MIN_SD_FREE):
+        self.ram_folder = ram_folder
+        self.spill_folder = spill_folder
+        self.high_water = high_water
+        self.low_water = low_water
+        self.interval = interval
+        self.min_free = min_free
+        self.frames = deque()  # Frames allowed to leave the RAM folder, oldest first
+        self.idle = threading.Event()
+        self.idle.set()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.spilled = 0
+        self.spilled_bytes = 0
+        self.spill_time = 0.0
+        self.sd_full = False
+        if spill_folder:
+            os.makedirs(spill_folder, exist_ok=True)
+
+    def add(self, path):
+        self.frames.append(path)
+
+    # Pause the copy while a photo is being taken; returns once the chunk in progress, if any, is written
+    def hold(self):
+        self.idle.clear()
+        with self.lock:
+            pass
+
+    def release(self):
+        self.idle.set()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.release()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            usage, _ = read_disk_usage(self.ram_folder)
+            if usage > self.high_water:
+                self.spill(usage)
+
+    # Move the oldest frames out until the usage is back under the low-water mark
+    def spill(self, usage):
+        while usage > self.low_water and self.frames and not self.stop_event.is_set():
+            if self.spill_folder and read_disk_usage(self.spill_folder)[1] < self.min_free:
+                if not self.sd_full:
+                    print("SD card almost full, frames are no longer spilled.")
+                self.sd_full = True
+                return
+            path = self.frames.popleft()
+            size = os.path.getsize(path)
+            start_time = time.perf_counter()
+            if self.spill_folder:
+                self.copy(path, os.path.join(self.spill_folder, os.path.basename(path)))
+            os.remove(path)
+            self.spill_time += time.perf_counter() - start_time
+            self.spilled += 1
+            self.spilled_bytes += size
+            usage, _ = read_disk_usage(self.ram_folder)
+
+    # Copy a frame chunk by chunk, only while the manager is not held
+    def copy(self, source_path, target_path):
+        with open(source_path, 'rb') as source, open(target_path, 'wb') as target:
+            while True:
+                self.idle.wait()
+                with self.lock:
+                    if not self.idle.is_set():
+                        continue
+                    chunk = source.read(CHUNK_SIZE)
+                    if chunk:
+                        target.write(chunk)
+                if not chunk:
+                    break
+
+    def report(self):
+        if not self.spilled:
+            return "Storage: no frames spilled."
+        action = f"moved to {self.spill_folder}" if self.spill_folder else "removed (archived)"
+        rate = self.spilled_bytes / self.spill_time / 1e6 if self.spill_time else 0.0
+        return f"Storage: {self.spilled} frames ({self.spilled_bytes / 1e6:.1f} MB) {action}, {rate:.1f} MB/s"
@@ -0,0 +1,169 @@
+import os
+import csv
+import math
+import time
+from Camera_manager import CameraManager
+from Resource_monitor import ResourceMonitor
+
+# Adaptive capture-time sweep shared by TimeCapture, TimeCaptureWidths, TimeCaptureHeights and
+# TimeCaptureTimeExposure. Compared with measuring every point with 7 captures and retrying forever:
+#   - the camera stays open, only the resolution or the exposure changes between points;
+#   - a point is sampled until the 95% confidence interval of its mean capture time is within
+#     ci_target of the mean (min_samples to max_samples captures after the warmup captures);
+#   - a point that does not converge is retried at most max_retries times, after a cool-down;
+#   - the candidate points are ordered by pixel count (or exposure); a coarse grid is measured first,
+#     then an interval is bisected only while its midpoint is not on the line between its ends,
+#     i.e. where the capture time changes regime. Linear intervals are not measured further;
+#   - shard=(index, count) splits the coarse intervals over several cameras running the same sweep.
+
+CSV_HEADER = ["Resolution", "Pixel count", "Average time (s)", "Exposure time (us)", "Average size (bytes)",
+              "CI half-width (s)", "Samples", "Converged"]
+
+CAMERA_CONTROLS = {
+    "AnalogueGain": 1.0,             # Set analog gain
+    "ColourGains": (1.0, 1.0),       # Set color gains for white balance
+    "Brightness": 0.5,               # Set brightness
+    "Contrast": 1.0,                 # Set contrast
+}
+
+# Two-sided 95% quantiles of Student's t distribution for 1 to 30 degrees of freedom
+T_QUANTILES = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+               2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+               2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+# Mean and half-width of the 95% confidence interval of the mean
+def confidence_interval(values):
+    count = len(values)
+    mean = sum(values) / count
+    if count < 2:
+        return mean, float('inf')
+    deviation = math.sqrt(sum((value - mean) ** 2 for value in values) / (count - 1))
+    quantile = T_QUANTILES[count - 2] if count - 1 <= len(T_QUANTILES) else 1.96
+    return mean, quantile * deviation / math.sqrt(count)
+
+class SweepHarness:
+    def __init__(self, camera_factory=None, warmup=2, min_samples=3, max_samples=15, ci_target=0.02, max_retries=2,
+                 regime_tolerance=0.03, coarse_points=9, max_temp=40.0, max_cpu_usage=20.0, folder='.'):
+        self.camera = CameraManager(camera_factory)
+        self.monitor = ResourceMonitor().start()
+        self.warmup = warmup
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.ci_target = ci_target
+        self.max_retries = max_retries
+        self.regime_tolerance = regime_tolerance
+        self.coarse_points = coarse_points
+        self.max_temp = max_temp
+        self.max_cpu_usage = max_cpu_usage
+        self.folder = folder
+        self.captures = 0
+
+    # Capture time of one (width, height, exposure) point, sampled until its confidence interval is tight
+    def measure(self, width, height, exposure_time):
+        self.camera.configure(width, height, exposure_time, CAMERA_CONTROLS)
+        image_path = os.path.join(self.folder, f"image_{width}x{height}_{exposure_time}.jpg")
+        for attempt in range(self.max_retries + 1):
+            times, sizes = [], []
+            mean, half_width = 0.0, float('inf')
+            for index in range(self.warmup + self.max_samples):
+                start_time = time.perf_counter()
+                self.camera.capture_file(image_path)
+                elapsed = time.perf_counter() - start_time
+                self.captures += 1
+                if index < self.warmup:
+                    continue
+                times.append(elapsed)
+                sizes.append(os.path.getsize(image_path))
+                if len(times) >= self.min_samples:
+                    mean, half_width = confidence_interval(times)
+                    if half_width <= self.ci_target * mean:
+                        break
+            os.remove(image_path)
+            converged = half_width <= self.ci_target * mean
+            if converged or attempt == self.max_retries:
+                break
+            print(f"{width}x{height} {exposure_time} µs: ±{half_width / mean * 100:.1f}% after "
+                  f"{len(times)} captures, retrying after a cool-down.")
+            self.monitor.wait_for_conditions(self.max_temp, self.max_cpu_usage)
+        print(f"{width}x{height} {exposure_time} µs: {mean * 1000:.2f} ± {half_width * 1000:.2f} ms "
+              f"({len(times)} captures{'' if converged else ', not converged'})")
+        return {
+            'width': width, 'height': height, 'exposure_time': exposure_time,
+            'time': mean, 'half_width': half_width, 'size': sum(sizes) / len(sizes),
+            'samples': len(times), 'converged': converged,
+        }
+
+    # Measure the points (width, height, exposure) ordered by key, bisecting only where the regime changes
+    def sweep(self, points, key, csv_file, shard=(0, 1)):
+        points = sorted(points, key=key)
+        results = {}
+        with open(csv_file, mode="w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(CSV_HEADER)
+
+            def measure(index):
+                if index not in results:
+                    results[index] = self.measure(*points[index])
+                    write_row(writer, results[index])
+                    file.flush()
+                return results[index]
+
+            step = max((len(points) - 1) // max(self.coarse_points - 1, 1), 1)
+            grid = list(range(0, len(points) - 1, step)) + [len(points) - 1]
+            intervals = [(grid[i], grid[i + 1]) for i in range(len(grid) - 1)]
+            index, count = shard
+            pending = intervals[index::count]
+            while pending:
+                first, last = pending.pop()
+                low, high = measure(first), measure(last)
+                if last - first < 2:
+                    continue
+                middle = (first + last) // 2
+                result = measure(middle)
+                # Capture time predicted at the midpoint by the line between the interval ends
+                fraction = (key(points[middle]) - key(points[first])) / ((key(points[last]) - key(points[first])) or 1)
+                predicted = low['time'] + fraction * (high['time'] - low['time'])
+                margin = max(self.regime_tolerance * predicted, result['half_width'] + max(low['half_width'], high['half_width']))
+                if abs(result['time'] - predicted) > margin:
+                    pending += [(first, middle), (middle, last)]
+        print(f"Sweep: {len(results)} of {len(points)} points measured with {self.captures} captures")
+        return [results[index] for index in sorted(results)]
+
+    def close(self):
+        self.monitor.stop()
+        self.camera.close()
+
+def write_row(writer, result):
+    writer.writerow([f"{result['width']}x{result['height']}", result['width'] * result['height'], result['time'],
+                     result['exposure_time'], result['size'], result['half_width'], result['samples'],
+                     int(result['converged'])])
+
+# Points of a one-parameter sweep: the axis is 'width', 'height' or 'exposure'
+def axis_points(axis, values, width, height, exposure_time):
+    if axis == 'width':
+        return [(value, height, exposure_time) for value in values]
+    if axis == 'height':
+        return [(width, value, exposure_time) for value in values]
+    return [(width, height, value) for value in values]
+
+# Sweep one parameter with the others fixed; the points are ordered by pixel count, or by exposure
+def run_axis_sweep(axis, values, width=4056, height=3040, exposure_time=10000, csv_file="capture_results.csv",
+                   camera_factory=None, shard=(0, 1)):
+    harness = SweepHarness(camera_factory)
+    os.system('sudo cpufreq-set -g performance')
+    key = (lambda point: point[2]) if axis == 'exposure' else (lambda point: point[0] * point[1])
+    try:
+        return harness.sweep(axis_points(axis, values, width, height, exposure_time), key, csv_file, shard)
+    finally:
+        harness.close()
+
+# Options shared by the sweep scripts: --shard index/count and --fake (simulated camera, off the rig)
+def parse_options(arguments):
+    shard = (0, 1)
+    if '--shard' in arguments:
+        shard = tuple(int(part) for part in arguments[arguments.index('--shard') + 1].split('/'))
+    camera_factory = None
+    if '--fake' in arguments:
+        from Fake_camera import SimulatedCamera
+        camera_factory = lambda: SimulatedCamera(seed=0)
+    return camera_factory, shard
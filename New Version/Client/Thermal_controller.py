@@ -0,0 +1,78 @@
+import time
+from collections import deque
+import numpy as np
+
+# Watches the temperature and capture-latency trends during a session and predicts thermal throttling
+# before the latency drifts far enough to show up as anomalies.
+# Every frame adds (time, last temperature sampled by the resource monitor, capture latency) to a sliding
+# window; a least-squares line through the window gives the temperature slope and a Theil-Sen line
+# (median of the pairwise slopes) the latency slope, so a single capture spike does not look like a trend.
+# A warning is raised when, within horizon seconds at the current slopes, either
+#   - the temperature reaches throttle_temp (the Pi firmware starts throttling the ARM clock at 80 °C), or
+#   - the latency, extrapolated no further ahead than the window covers, drifts more than max_drift
+#     above the reference latency of the first full window.
+# The warning carries the slowdown factor to apply to the trigger interval: at least slowdown, more if
+# the latency is predicted to grow further. After a warning the controller waits for a new cadence or
+# for a full window before warning again.
+class ThermalController:
+    def __init__(self, monitor, window=100, throttle_temp=80.0, horizon=60.0, max_drift=0.06, slowdown=1.25):
+        self.monitor = monitor
+        self.window = window
+        self.throttle_temp = throttle_temp
+        self.horizon = horizon
+        self.max_drift = max_drift
+        self.slowdown = slowdown
+        self.samples = deque(maxlen=window)  # (time, temperature or None, latency)
+        self.reference_latency = None
+        self.frames_since_warning = window
+        self.warnings = []
+
+    # Add one frame, return (seconds until throttling or None, slowdown factor) when a warning is due
+    def record(self, capture_delay):
+        self.samples.append((time.time(), self.monitor.cpu_temp, capture_delay))
+        self.frames_since_warning += 1
+        if len(self.samples) < self.window:
+            return None
+        times, temps, latencies = zip(*self.samples)
+        times = np.asarray(times) - times[-1]
+        if self.reference_latency is None:
+            self.reference_latency = float(np.median(latencies))
+        if self.frames_since_warning < self.window:
+            return None
+
+        time_to_throttle = None
+        if all(temp is not None for temp in temps):
+            temp_slope, temp_now = np.polyfit(times, temps, 1)
+            if temp_now >= self.throttle_temp:
+                time_to_throttle = 0.0
+            elif temp_slope > 0:
+                time_to_throttle = (self.throttle_temp - temp_now) / temp_slope
+
+        latency_slope, latency_now = theil_sen(times, np.asarray(latencies))
+        lookahead = min(self.horizon, -times[0])  # A short window is too noisy to extrapolate far
+        predicted_latency = latency_now + max(latency_slope, 0.0) * lookahead
+        drift = predicted_latency / self.reference_latency - 1
+
+        throttling = time_to_throttle is not None and time_to_throttle < self.horizon
+        if not throttling and drift <= self.max_drift:
+            return None
+        factor = max(self.slowdown, 1 + drift)
+        self.frames_since_warning = 0
+        self.warnings.append((time.time(), time_to_throttle, factor))
+        return time_to_throttle, factor
+
+    # The server lowered the frame rate: the latency reference is measured again at the new cadence
+    def set_cadence(self, interval):
+        self.samples.clear()
+        self.reference_latency = None
+        self.frames_since_warning = self.window
+
+# Median of the pairwise slopes and the matching intercept at time 0
+def theil_sen(x, y):
+    first, second = np.triu_indices(len(x), 1)
+    dx = x[second] - x[first]
+    valid = dx > 0
+    if not valid.any():
+        return 0.0, float(np.median(y))
+    slope = float(np.median((y[second] - y[first])[valid] / dx[valid]))
+    return slope, float(np.median(y - slope * x))
@@ -0,0 +1,70 @@
+import os
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+from Test_server import merge_csv_files, merge_results
+from Timing_results import load_results
+
+# Write one timing CSV per camera in the format written by older Test_client runs
+def write_synthetic_results(folder, num_cameras, num_photos, drop_rate=0.01, seed=0):
+    rng = np.random.default_rng(seed)
+    for cam_num in range(1, num_cameras + 1):
+        photo_index = np.arange(4, num_photos + 4)
+        kept = rng.random(num_photos) >= drop_rate  # Simulate a few missing frames per camera
+        capture_times = 0.25 + rng.normal(0.0, 0.005, num_photos)
+        relative_errors = np.abs(capture_times - 0.25) / 0.25 * 100
+        df = pd.DataFrame({
+            "Photo_Index": photo_index[kept],
+            "Capture_Time (s)": capture_times[kept],
+            "Relative_Error (%)": relative_errors[kept],
+        })
+        df.to_csv(os.path.join(folder, f'capture_data_cam_{cam_num:02d}.csv'), index=False)
+
+# Convert the synthetic CSV files to the long-layout files written by Test_client.save_results_to_npz
+def convert_to_npz(csv_folder, npz_folder):
+    for cam_num, file in enumerate(sorted(os.listdir(csv_folder)), start=1):
+        df = pd.read_csv(os.path.join(csv_folder, file))
+        np.savez(os.path.join(npz_folder, file.replace('.csv', '.npz')),
+                 camera=np.full(len(df), cam_num, dtype=np.int16),
+                 photo=df['Photo_Index'].to_numpy(np.int32),
+                 time=df['Capture_Time (s)'].to_numpy(np.float64),
+                 error=df['Relative_Error (%)'].to_numpy(np.float32))
+
+# Time the wide CSV merge and the long-layout merge on the same synthetic dataset
+# Returns the best of several runs in seconds and the size of each merged file in bytes
+def benchmark_merge(num_cameras, num_photos, repeats=3):
+    previous_folder = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_folder:
+        csv_folder = os.path.join(work_folder, 'Test')
+        npz_folder = os.path.join(work_folder, 'Test_npz')
+        os.makedirs(csv_folder)
+        os.makedirs(npz_folder)
+        write_synthetic_results(csv_folder, num_cameras, num_photos)
+        convert_to_npz(csv_folder, npz_folder)
+        os.chdir(work_folder)  # Both merges write their output in the current folder
+        try:
+            csv_timings = []
+            npz_timings = []
+            for _ in range(repeats):
+                start_time = time.perf_counter()
+                merge_csv_files(csv_folder, num_cameras, 4056, 3040, 10000)
+                csv_timings.append(time.perf_counter() - start_time)
+
+                start_time = time.perf_counter()
+                results_file = merge_results(npz_folder, 4056, 3040, 10000)
+                load_results(results_file)
+                npz_timings.append(time.perf_counter() - start_time)
+            csv_size = os.path.getsize('merged_capture_data_with_differences_4056x3040_10000.csv')
+            npz_size = os.path.getsize(results_file)
+        finally:
+            os.chdir(previous_folder)
+    return min(csv_timings), csv_size, min(npz_timings), npz_size
+
+if __name__ == '__main__':
+    num_photos = 2000
+    for num_cameras in (12, 64):
+        csv_time, csv_size, npz_time, npz_size = benchmark_merge(num_cameras, num_photos)
+        print(f"{num_cameras} cameras x {num_photos} photos: "
+              f"CSV merge {csv_time:.3f} s ({csv_size / 1e6:.1f} MB), "
+              f"npz merge + load {npz_time:.3f} s ({npz_size / 1e6:.1f} MB)")
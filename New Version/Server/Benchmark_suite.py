@@ -0,0 +1,189 @@
+import os
+import sys
+import csv
+import json
+import time
+import socket
+import tempfile
+import threading
+import numpy as np
+from Load_generator import run_engine, CLIENT_FOLDER
+from Benchmark_merge import benchmark_merge
+from Timing_results import pairwise_statistics
+from Sync_analysis import camera_offsets
+from Frame_receiver import receive_container
+
+sys.path.append(CLIENT_FOLDER)
+from Camera_manager import CameraManager
+from Fake_camera import SimulatedCamera
+from Incremental_archive import IncrementalArchiver
+from Frame_transfer import send_container
+
+# End-to-end benchmark of the capture cycle: trigger dispatch, ACK collection, per-frame capture,
+# archive creation, frame transfer and merge/analysis. Every stage runs without the rig (simulated
+# cameras over loopback), except the capture stage which reads a TimeCapture sweep when one is given.
+# Results are written as flat JSON {"stage.metric_unit": value} and compared with a stored baseline;
+# a metric more than TOLERANCE worse than its baseline value, and worse by more than the noise floor
+# of its unit, is reported as a regression.
+
+BASELINE_FILE = 'benchmark_baseline.json'
+TOLERANCE = 0.20
+HIGHER_IS_BETTER = ('_fps', '_per_s')
+NOISE_FLOOR = {'_ms': 1.0, '_s': 0.05}  # Absolute differences below this are scheduling noise
+
+# Trigger dispatch, ACK collection, connection and retrieval from a simulated engine session
+def engine_stage(num_cameras, num_frames):
+    summary = run_engine(num_cameras, num_frames)
+    prefix = f'engine_{num_cameras}'
+    return {
+        f'{prefix}.dispatch_mean_ms': summary['dispatch_mean_ms'],
+        f'{prefix}.dispatch_max_ms': summary['dispatch_max_ms'],
+        f'{prefix}.ack_mean_ms': summary['ack_mean_ms'],
+        f'{prefix}.ack_max_ms': summary['ack_max_ms'],
+        f'{prefix}.capture_fps': summary['fps'],
+        f'{prefix}.connect_s': summary['stages']['connect'],
+        f'{prefix}.retrieve_s': summary['stages']['retrieve'],
+        f'{prefix}.spread_max_ms': summary['spread_max_ms'],
+    }
+
+# Per-frame capture time per resolution, from a TimeCapture sweep CSV or measured on the simulated camera
+def capture_stage(sweep_csv=None, resolutions=((640, 480), (1920, 1080), (4056, 3040)), frames=5):
+    results = {}
+    if sweep_csv:
+        with open(sweep_csv, newline='') as file:
+            for row in csv.DictReader(file):
+                results[f"capture.{row['Resolution']}_ms"] = float(row['Average time (s)']) * 1000
+        return results
+
+    camera = CameraManager(lambda: SimulatedCamera(seed=0, open_time=0.0, configure_time=0.0, start_time=0.0))
+    with tempfile.TemporaryDirectory() as folder:
+        for width, height in resolutions:
+            camera.configure(width, height, 10000)
+            times = []
+            for index in range(frames):
+                start_time = time.perf_counter()
+                camera.capture_file(os.path.join(folder, f'img{index}.jpg'))
+                times.append(time.perf_counter() - start_time)
+            results[f'capture.{width}x{height}_ms'] = float(np.median(times) * 1000)
+    camera.close()
+    return results
+
+# Write num_frames synthetic JPEG-sized frames into a folder
+def write_frames(folder, num_frames, frame_size):
+    paths = []
+    for index in range(1, num_frames + 1):
+        path = os.path.join(folder, f'img{index}.jpg')
+        with open(path, 'wb') as file:
+            file.write(os.urandom(frame_size))
+        paths.append(path)
+    return paths
+
+# Incremental ZIP archiving: per-file overhead and the finalization left after the last frame
+def archive_stage(num_frames=100, frame_size=500_000):
+    with tempfile.TemporaryDirectory() as folder:
+        frames_folder = os.path.join(folder, 'frames')
+        os.makedirs(frames_folder)
+        paths = write_frames(frames_folder, num_frames, frame_size)
+        archiver = IncrementalArchiver(os.path.join(folder, 'images.zip'), frames_folder)
+        for path in paths:
+            archiver.add(path)
+        archiver.finalize()
+    return {
+        'archive.per_file_mean_ms': sum(archiver.append_times) / len(archiver.append_times) * 1000,
+        'archive.finalize_ms': archiver.finalize_time * 1000,
+    }
+
+# Container transfer over loopback, sendfile on the sender and the container receiver on the server
+def transfer_stage(num_frames=100, frame_size=500_000):
+    with tempfile.TemporaryDirectory() as folder:
+        frames_folder = os.path.join(folder, 'frames')
+        os.makedirs(frames_folder)
+        write_frames(frames_folder, num_frames, frame_size)
+        listener = socket.create_server(('127.0.0.1', 0))
+        received = {}
+
+        def receive():
+            conn, _ = listener.accept()
+            with conn:
+                received['bytes'] = receive_container(conn, os.path.join(folder, 'frames.crpf'))
+
+        thread = threading.Thread(target=receive)
+        thread.start()
+        start_time = time.perf_counter()
+        with socket.create_connection(listener.getsockname()) as sock:
+            send_container(sock, frames_folder)
+        thread.join()
+        elapsed = time.perf_counter() - start_time
+        listener.close()
+    return {
+        'transfer.container_s': elapsed,
+        'transfer.throughput_mb_per_s': received['bytes'] / elapsed / 1e6,
+    }
+
+# Merge of the per-camera timing files and the synchronization analysis of the merged results
+def analysis_stage(num_cameras=64, num_photos=2000):
+    _, _, merge_time, _ = benchmark_merge(num_cameras, num_photos, repeats=1)
+    rng = np.random.default_rng(0)
+    matrix = 0.25 + rng.normal(0.0, 0.005, (num_photos, num_cameras))
+    start_time = time.perf_counter()
+    pairwise_statistics(matrix)
+    camera_offsets(matrix, 'lstsq')
+    return {
+        f'merge_{num_cameras}.merge_load_s': merge_time,
+        f'analysis_{num_cameras}.offsets_s': time.perf_counter() - start_time,
+    }
+
+def run_suite(quick=False, sweep_csv=None):
+    results = {}
+    for num_cameras in ((12,) if quick else (12, 64)):
+        results.update(engine_stage(num_cameras, 20 if quick else 50))
+    results.update(capture_stage(sweep_csv))
+    results.update(archive_stage())
+    results.update(transfer_stage())
+    results.update(analysis_stage(num_cameras=12 if quick else 64))
+    return results
+
+# Metrics more than tolerance worse than the baseline, as (name, baseline value, value)
+def find_regressions(results, baseline, tolerance=TOLERANCE):
+    regressions = []
+    for name, value in results.items():
+        reference = baseline.get(name)
+        if reference is None or value is None or not reference:
+            continue
+        floor = next((floor for unit, floor in NOISE_FLOOR.items() if name.endswith(unit)), 0.0)
+        if name.endswith(HIGHER_IS_BETTER):
+            worse = value < reference * (1 - tolerance)
+        else:
+            worse = value > reference * (1 + tolerance) + floor
+        if worse:
+            regressions.append((name, reference, value))
+    return regressions
+
+# Usage: python Benchmark_suite.py [--quick] [--sweep capture_results.csv] [--output results.json] [--update-baseline]
+# The baseline is written by the first run (or with --update-baseline); later runs are compared with it
+# and the exit status is 1 when a stage regressed.
+if __name__ == '__main__':
+    arguments = sys.argv[1:]
+    sweep_csv = arguments[arguments.index('--sweep') + 1] if '--sweep' in arguments else None
+    output_file = arguments[arguments.index('--output') + 1] if '--output' in arguments else 'benchmark_results.json'
+
+    results = run_suite(quick='--quick' in arguments, sweep_csv=sweep_csv)
+    with open(output_file, 'w') as file:
+        json.dump(results, file, indent=2)
+    for name, value in results.items():
+        print(f"{name}: {value:.3f}" if value is not None else f"{name}: n/a")
+    print(f"Results saved in {output_file}")
+
+    if '--update-baseline' in arguments or not os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f"Baseline saved in {BASELINE_FILE}")
+        sys.exit(0)
+
+    with open(BASELINE_FILE) as file:
+        regressions = find_regressions(results, json.load(file))
+    for name, reference, value in regressions:
+        print(f"REGRESSION {name}: {reference:.3f} -> {value:.3f}")
+    if not regressions:
+        print(f"No regression beyond {TOLERANCE:.0%} of the baseline.")
+    sys.exit(1 if regressions else 0)
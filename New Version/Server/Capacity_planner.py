@@ -0,0 +1,95 @@
+import os
+import sys
+from Latency_model import load_model, fit_model, MODEL_FILE
+
+# Predicts, before a session, how long the cameras can record at given settings: the sustainable frame
+# rate, the number of frames the tmpfs holds and the time to bring the frames back to the server.
+# The capture time, the trigger period and the JPEG size come from the latency model (Latency_model.py),
+# fitted on a TimeCapture sweep (Client/TimeCapture.py writes capture_results.csv).
+# The tmpfs is sized from each camera's available memory: the plan uses the smallest tmpfs the cameras
+# reported in the last session (stored with the latency model), TMPFS_BYTES before any session.
+
+SWEEP_FILE = 'capture_results.csv'
+TMPFS_BYTES = 2 * 1024 ** 3     # Assumed tmpfs size until the cameras reported theirs
+RAM_THRESHOLD = 90.0            # RAM_LOW threshold of the agent (%)
+SPILL_RATE = 10e6               # Bytes per second the agent moves from tmpfs to the SD card between triggers
+LINK_RATE = 110e6               # Bytes per second received by the server over Gigabit Ethernet
+
+class CapacityPlanner:
+    # tmpfs_bytes: tmpfs of the cameras, None if unknown (TMPFS_BYTES is assumed)
+    def __init__(self, model, tmpfs_bytes=None, spill_rate=SPILL_RATE, link_rate=LINK_RATE):
+        self.model = model
+        self.tmpfs_known = tmpfs_bytes is not None
+        self.tmpfs_bytes = tmpfs_bytes if self.tmpfs_known else TMPFS_BYTES
+        self.spill_rate = spill_rate
+        self.link_rate = link_rate
+
+    def capture_time(self, width, height, exposure_time):
+        return self.model.capture_time(width, height, exposure_time)
+
+    def frame_size(self, width, height):
+        return self.model.frame_size(width, height)
+
+    # Prediction for one setting; frames=None predicts for a session recording until the tmpfs is full
+    def predict(self, width, height, exposure_time, delay, num_cameras, frames=None):
+        capture_time = self.capture_time(width, height, exposure_time)
+        frame_size = self.frame_size(width, height)
+        fps = 1 / self.model.trigger_interval(width, height, exposure_time, num_cameras, delay)
+        usable = self.tmpfs_bytes * RAM_THRESHOLD / 100
+        max_frames = int(usable // frame_size)
+        data_rate = frame_size * fps
+        if data_rate <= self.spill_rate:
+            session_seconds = float('inf')  # The spilling to the SD card keeps up with the capture
+        else:
+            session_seconds = usable / (data_rate - self.spill_rate)
+        if frames is None and session_seconds != float('inf'):
+            frames = int(session_seconds * fps)
+        return {
+            'capture_time_s': capture_time,
+            'frame_size_bytes': frame_size,
+            'max_fps': fps,
+            'frames_in_tmpfs': max_frames,
+            'session_s': session_seconds,
+            'frames': frames,
+            # Time to bring the frames of every camera back, per second of recording and for the whole session
+            'transfer_s_per_s': num_cameras * data_rate / self.link_rate,
+            'transfer_s': num_cameras * frames * frame_size / self.link_rate if frames is not None else None,
+        }
+
+    def report(self, width, height, exposure_time, delay, num_cameras, frames=None):
+        plan = self.predict(width, height, exposure_time, delay, num_cameras, frames)
+        print(f"Prediction for {width}x{height}, {exposure_time} µs, {delay} s lead time, {num_cameras} cameras:")
+        print(f"  capture {plan['capture_time_s'] * 1000:.1f} ms, JPEG {plan['frame_size_bytes'] / 1e6:.2f} MB, "
+              f"up to {plan['max_fps']:.2f} fps")
+        print(f"  tmpfs holds {plan['frames_in_tmpfs']} frames "
+              f"({plan['frames_in_tmpfs'] / plan['max_fps']:.0f} s at full rate without spilling)")
+        if self.tmpfs_known:
+            print(f"  (smallest camera tmpfs {self.tmpfs_bytes / 1024 ** 2:.0f} MB, reported in the last session)")
+        else:
+            print(f"  (assumes a {TMPFS_BYTES / 1024 ** 3:.0f} GiB tmpfs: the cameras have not reported theirs yet, "
+                  f"it is sized from their available memory)")
+        if plan['session_s'] == float('inf'):
+            print("  the SD card spill keeps up: the session length is only limited by the SD card")
+        else:
+            print(f"  RAM_LOW after about {plan['session_s']:.0f} s ({plan['frames']} frames)")
+        print(f"  transfer: {plan['transfer_s_per_s']:.2f} s per second recorded", end='')
+        print(f", {plan['transfer_s']:.0f} s for {plan['frames']} frames" if plan['transfer_s'] is not None else '')
+        return plan
+
+# Print the prediction from the stored latency model, or from a model fitted on the sweep, None without either
+def show_prediction(width, height, exposure_time, delay, num_cameras, csv_file=SWEEP_FILE):
+    model = load_model()
+    if model is None and os.path.exists(csv_file):
+        model = fit_model(csv_file)
+    if model is None:
+        print(f"No latency model ({MODEL_FILE}) or capture sweep ({csv_file}), run Client/TimeCapture.py "
+              f"and Latency_model.py for a prediction.")
+        return None
+    return CapacityPlanner(model, model.tmpfs_bytes).report(width, height, exposure_time, delay, num_cameras)
+
+# Usage: python Capacity_planner.py width height exposure_time delay [cameras] [capture_results.csv]
+if __name__ == '__main__':
+    width, height, exposure_time = (int(value) for value in sys.argv[1:4])
+    delay = float(sys.argv[4])
+    num_cameras = int(sys.argv[5]) if len(sys.argv) > 5 else 12
+    show_prediction(width, height, exposure_time, delay, num_cameras, *sys.argv[6:7])
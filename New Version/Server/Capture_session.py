@@ -0,0 +1,635 @@
+import os
+import time
+import socket
+import zipfile
+import threading
+import paramiko
+from paramiko import SSHClient
+from scp import SCPClient
+from Frame_receiver import open_transfer_socket, receive_all_containers
+from Latency_model import load_model
+from Raw_converter import convert_session
+from Frame_index import ingest_session
+from Frame_sets import assemble_session
+
+# Capture-session engine shared by Speckle_server, Checkerboard_server, Test_server and Stereo_server.
+# The session owns the connections, the trigger loop and the stop handshake, the mode decides
+# the camera profile, how many photos are taken and how the results are retrieved.
+# The cameras run Client/Camera_agent.py, which stays up between sessions; messages are newline terminated.
+# Every trigger carries an id, 1 for the first trigger of a session and increasing by one (TAKE_PHOTO <id> <time>);
+# the cameras echo it in their acknowledgment and name the frame after it, the session checks every echo.
+
+num_cameras = 12
+PORT = 5000
+
+# Camera N is reachable at 192.168.1.N with the account adminN / AdminN
+def camera_credentials(cam_num):
+    return f'192.168.1.{cam_num}', f'admin{cam_num}', f'Admin{cam_num}'
+
+# Ask the operator for the capture settings; with a fitted latency model an empty delay takes its safe delay
+def prompt_settings(num_cameras=num_cameras):
+    while True:
+        width = int(input("Enter the desired resolution width: "))
+        height = int(input("Enter the desired resolution height: "))
+
+        if width > 4056 or height > 3040:
+            print("Error: Resolution exceeds the maximum of 4056x3040. Please try again.")
+        else:
+            break
+    exposure_time = int(input("Enter the desired exposure time (in µs): "))
+    model = load_model()
+    if model is None:
+        delay = float(input("Enter the wait delay before capturing (in seconds): "))
+    else:
+        safe_delay = model.safe_delay(num_cameras)
+        interval = model.trigger_interval(width, height, exposure_time, num_cameras)
+        print(f"Latency model: capture {model.capture_time(width, height, exposure_time) * 1000:.1f} ms, "
+              f"safe delay {safe_delay:.3f} s, trigger interval {interval:.3f} s ({1 / interval:.2f} fps)")
+        answer = input(f"Enter the wait delay before capturing (in seconds, empty for {safe_delay:.3f}): ")
+        delay = float(answer) if answer.strip() else safe_delay
+    return width, height, exposure_time, delay
+
+# Starts an SSH client to connect and execute a script on a remote Raspberry Pi
+def start_client(ip, username, password, script_path):
+    ssh = paramiko.SSHClient()
+    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+
+    try:
+        print(f"Attempting to connect to {ip} as {username}")
+        ssh.connect(ip, username=username, password=password)
+        print(f"Connected to {ip}, launching script")
+        stdin, stdout, stderr = ssh.exec_command(f'nohup sudo python3 {script_path} > /dev/null 2>&1 &')
+        print(f"Script launched on {ip}.")
+
+        output = stdout.read().decode()
+        errors = stderr.read().decode()
+
+        if output:
+            print(f"Output: {output}")
+        if errors:
+            print(f"Errors: {errors}")
+
+    except Exception as e:
+        print(f"Error connecting to {ip}: {e}")
+
+    finally:
+        ssh.close()
+
+# Launch the client script (or the camera agent) on every camera, each in its own thread
+def start_all_clients_simultaneously(script_name, cam_nums):
+    threads = []
+    for cam_num in cam_nums:
+        ip, username, password = camera_credentials(cam_num)
+        script_path = f'/home/{username}/Documents/Client/{script_name}'
+        thread = threading.Thread(target=start_client, args=(ip, username, password, script_path))
+        threads.append(thread)
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    print("All clients have launched their scripts.")
+
+# Fetch one file from a camera over SCP
+def receive_scp(cam_num, remote_path, local_path):
+    ip, username, password = camera_credentials(cam_num)
+    ssh = SSHClient()
+    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    ssh.connect(ip, username=username, password=password)
+    with SCPClient(ssh.get_transport()) as scp:
+        scp.get(remote_path, local_path)
+    ssh.close()
+    print(f"File for Camera {cam_num} received and saved at {local_path}.")
+
+# Extracts a ZIP file into a specified folder
+def extract_zip(zip_filename, extract_to):
+    with zipfile.ZipFile(zip_filename, 'r') as zipf:
+        zipf.extractall(extract_to)
+    print(f"ZIP file {zip_filename} extracted into {extract_to}")
+
+# Control connection to one camera client.
+# Messages are newline terminated, the data received after an expected token is kept for the next read.
+class ClientLink:
+    def __init__(self, sock, cam_num):
+        self.sock = sock
+        self.cam_num = cam_num
+        self.address = sock.getpeername()[0]  # Frame transfers are matched to the camera by this address
+        self.buffer = b''
+
+    def send(self, message):
+        self.sock.sendall(message + b'\n')
+
+    # Return the next non-empty message (expect leaves the end of the line it matched in the buffer)
+    def recv_line(self):
+        while True:
+            while b'\n' not in self.buffer:
+                data = self.sock.recv(1024)
+                if not data:
+                    raise ConnectionError(f"Camera {self.cam_num} closed the connection")
+                self.buffer += data
+            line, self.buffer = self.buffer.split(b'\n', 1)
+            if line.strip():
+                return line.strip()
+
+    # Wait for the first of the given tokens; anything before it is discarded
+    def expect(self, *tokens):
+        while True:
+            found = [(self.buffer.find(token), token) for token in tokens if token in self.buffer]
+            if found:
+                position, token = min(found)
+                self.buffer = self.buffer[position + len(token):]
+                return token
+            data = self.sock.recv(1024)
+            if not data:
+                raise ConnectionError(f"Camera {self.cam_num} closed the connection")
+            self.buffer += data
+
+    def close(self):
+        self.sock.close()
+
+# Timings collected during a session, common to every mode
+class SessionMetrics:
+    def __init__(self):
+        self.dispatch_times = []
+        self.ack_times = []
+        self.stage_times = {}
+        self.client_starts = {}
+        self.tmpfs_sizes = {}  # Camera number: bytes of its tmpfs, from agents that report it
+        self.failed_frames = {}
+        self.throttle_warnings = []
+        self.anomalies = {}  # Camera number: [(photo, relative error in %)], streamed during the capture
+        self.acknowledged = {}  # Camera number: [trigger id of every frame the camera took]
+        self.id_mismatches = []  # (camera number, trigger id sent, trigger id acknowledged)
+        self.trigger_interval = 0.0
+        self.capture_start = None
+        self.capture_end = None
+
+    def record_trigger(self, dispatch_time, ack_time):
+        self.dispatch_times.append(dispatch_time)
+        self.ack_times.append(ack_time)
+
+    def record_stage(self, name, duration):
+        self.stage_times[name] = self.stage_times.get(name, 0.0) + duration
+
+    def record_failure(self, cam_num):
+        self.failed_frames[cam_num] = self.failed_frames.get(cam_num, 0) + 1
+
+    def record_ack(self, cam_num, trigger_id):
+        self.acknowledged.setdefault(cam_num, []).append(trigger_id)
+
+    def record_id_mismatch(self, cam_num, sent, acknowledged):
+        self.id_mismatches.append((cam_num, sent, acknowledged))
+
+    def record_anomaly(self, cam_num, photo, error):
+        self.anomalies.setdefault(cam_num, []).append((photo, error))
+
+    # time_to_throttle is None when the camera predicts a latency drift without a temperature reading
+    def record_throttle(self, cam_num, time_to_throttle, factor):
+        self.throttle_warnings.append((cam_num, time_to_throttle, factor))
+
+    # state is 'cold' for an agent serving its first session, setup_time is its one-time setup
+    def record_client_start(self, cam_num, state, setup_time, tmpfs_bytes=None):
+        self.client_starts[cam_num] = (state, setup_time)
+        if tmpfs_bytes is not None:
+            self.tmpfs_sizes[cam_num] = tmpfs_bytes
+
+    def summary(self):
+        frames = len(self.ack_times)
+        summary = {"frames": frames, "stages": dict(self.stage_times), "failed_frames": dict(self.failed_frames)}
+        cold = [setup_time for state, setup_time in self.client_starts.values() if state == 'cold']
+        summary["cold_clients"] = len(cold)
+        summary["warm_clients"] = len(self.client_starts) - len(cold)
+        summary["throttle_warnings"] = len(self.throttle_warnings)
+        summary["anomalies"] = {cam_num: len(photos) for cam_num, photos in self.anomalies.items()}
+        summary["id_mismatches"] = len(self.id_mismatches)
+        summary["trigger_interval_s"] = self.trigger_interval
+        if cold:
+            summary["cold_setup_mean_s"] = sum(cold) / len(cold)
+            summary["cold_setup_max_s"] = max(cold)
+        if frames:
+            summary["dispatch_mean_ms"] = sum(self.dispatch_times) / frames * 1000
+            summary["dispatch_max_ms"] = max(self.dispatch_times) * 1000
+            summary["ack_mean_ms"] = sum(self.ack_times) / frames * 1000
+            summary["ack_max_ms"] = max(self.ack_times) * 1000
+        if frames and self.capture_end:
+            summary["fps"] = frames / (self.capture_end - self.capture_start)
+        return summary
+
+    def report(self):
+        summary = self.summary()
+        print(f"Frames captured: {summary['frames']}")
+        if summary['frames']:
+            print(f"Trigger dispatch: mean {summary['dispatch_mean_ms']:.2f} ms, max {summary['dispatch_max_ms']:.2f} ms")
+            print(f"ACK collection: mean {summary['ack_mean_ms']:.2f} ms, max {summary['ack_max_ms']:.2f} ms")
+        if 'fps' in summary:
+            print(f"Capture rate: {summary['fps']:.2f} fps")
+        if summary['failed_frames']:
+            print(f"Failed captures per camera: {summary['failed_frames']}")
+        if summary['id_mismatches']:
+            cameras = sorted({cam_num for cam_num, _, _ in self.id_mismatches})
+            print(f"Trigger id mismatches: {summary['id_mismatches']}, cameras {cameras}")
+        if summary['throttle_warnings']:
+            cameras = sorted({cam_num for cam_num, _, _ in self.throttle_warnings})
+            print(f"Throttling predicted {summary['throttle_warnings']} times by cameras {cameras}, "
+                  f"final trigger interval {summary['trigger_interval_s']:.3f} s")
+        print(f"Client start: {summary['warm_clients']} warm, {summary['cold_clients']} cold", end='')
+        if summary['cold_clients']:
+            print(f" (setup mean {summary['cold_setup_mean_s']:.2f} s, max {summary['cold_setup_max_s']:.2f} s)", end='')
+        print()
+        for name, duration in summary['stages'].items():
+            print(f"Stage {name}: {duration:.2f} s")
+
+# Base capture mode: repeated triggers until Ctrl+C, nothing to retrieve
+class CaptureMode:
+    name = 'base'
+    client_script = None   # Single-session script for launch='script', None if the clients are started by hand
+    profile = 'standard'   # Camera controls profile applied by the agent
+    transfer_mode = 'none'
+    single_shot = False
+    uses_transfer_socket = False
+
+    def __init__(self, folder):
+        self.folder = folder
+
+    def prepare(self, session):
+        for cam_num in session.cam_nums:
+            os.makedirs(os.path.join(self.folder, f'Cam_{cam_num:02d}'), exist_ok=True)
+
+    def retrieve(self, session):
+        pass
+
+    # Work on the retrieved files once the cameras are released
+    def process(self, session):
+        pass
+
+# Speckle and checkerboard recording: continuous triggers, then frames from every client
+class ContinuousMode(CaptureMode):
+    name = 'continuous'
+
+    # raw_output and raw_color: what the raw frames of a 'raw' capture session are converted to (Raw_converter.py)
+    def __init__(self, folder, client_script, transfer_mode='sendfile', transfer_timeout=60.0, transfer_retries=2,
+                 profile='standard', raw_output='png', raw_color='gray'):
+        super().__init__(folder)
+        self.client_script = client_script
+        self.profile = profile
+        self.transfer_mode = transfer_mode  # Sent to the clients with the session request
+        self.uses_transfer_socket = transfer_mode == 'sendfile'
+        self.transfer_timeout = transfer_timeout
+        self.transfer_retries = transfer_retries
+        self.raw_output = raw_output
+        self.raw_color = raw_color
+
+    def retrieve(self, session):
+        # Wait for clients to be ready to send files
+        for link in session.links:
+            link.expect(b'READY')
+
+        # The anomalies were streamed during the capture
+        for link in session.links:
+            anomalies = [photo for photo, _ in session.metrics.anomalies.get(link.cam_num, [])]
+            if anomalies:
+                print(f"Camera {link.cam_num} encountered anomalies in the following photos: {anomalies}")
+            else:
+                print(f"No anomalies reported for Camera {link.cam_num}.")
+
+        # EXTRACTION_COMPLETE lets a client delete its images, so it is only sent once they are received
+        if self.transfer_mode == 'sendfile':
+            pending = self.receive_frames(session)
+        else:
+            print("ZIP files is ready to be send.")
+            pending = []
+            for link in session.links:
+                remote_path = f'/home/admin{link.cam_num}/Documents/Client/images.zip'
+                try:
+                    receive_scp(link.cam_num, remote_path, os.path.join(self.folder, f'Cam_{link.cam_num:02d}'))
+                    link.send(b'EXTRACTION_COMPLETE')
+                except Exception as e:
+                    print(f"Error receiving the ZIP file of Camera {link.cam_num}: {e}")
+                    pending.append(link)
+
+        for link in pending:
+            print(f"Error: images of Camera {link.cam_num} were not received, they are kept on the camera.")
+        print("Extraction complete notification sent to clients.")
+
+    # Ask the clients for their frames, retrying the cameras whose transfer failed
+    # Returns the links of the cameras whose frames never arrived
+    def receive_frames(self, session):
+        pending = list(session.links)
+        for attempt in range(self.transfer_retries + 1):
+            if not pending:
+                break
+            if attempt:
+                print(f"Retrying the frame transfer of cameras {[link.cam_num for link in pending]}...")
+            else:
+                print("Receiving frames from all clients...")
+            for link in pending:
+                link.send(b'SEND_FRAMES')
+            received = receive_all_containers(session.transfer_socket, self.folder,
+                                              {link.address: link.cam_num for link in pending}, self.transfer_timeout)
+            for link in pending:
+                if link.cam_num in received:
+                    link.send(b'EXTRACTION_COMPLETE')
+            pending = [link for link in pending if link.cam_num not in received]
+        return pending
+
+    # Raw frames are encoded here on every core of the server instead of on the cameras,
+    # then the frames of every camera are checked and indexed (Frame_index.py) and matched into sets of
+    # synchronized frames (Frame_sets.py)
+    def process(self, session):
+        if session.capture_mode == 'raw':
+            convert_session(self.folder, self.raw_output, self.raw_color)
+        if ingest_session(self.folder, session.metrics.anomalies):
+            assemble_session(self.folder, acknowledged=session.metrics.acknowledged)
+
+# Timing test: continuous triggers, then the per-camera timing results are fetched and analysed
+class TimingTestMode(CaptureMode):
+    name = 'timing_test'
+
+    # analyse(folder, width, height, exposure_time) may return a background process to wait for
+    def __init__(self, folder='Test', analyse=None,
+                 results_path='/home/admin{cam_num}/Documents/Client/capture_results{cam_num}.npz'):
+        super().__init__(folder)
+        self.analyse = analyse
+        self.results_path = results_path
+
+    def retrieve(self, session):
+        # Each client sends RESULTS_SAVED once its result file is written
+        for link in session.links:
+            link.expect(b'RESULTS_SAVED')
+        for cam_num in session.cam_nums:
+            remote_path = self.results_path.format(cam_num=cam_num)
+            receive_scp(cam_num, remote_path, os.path.join(self.folder, f'capture_data_cam_{cam_num:02d}.npz'))
+        if self.analyse:
+            process = self.analyse(self.folder, session.width, session.height, session.exposure_time)
+            if process is not None:
+                session.background.append(process)
+
+# Stereo pair: a single synchronized photo per camera (the single-shot mode),
+# the clients push their ZIP to the server which extracts them
+class StereoMode(CaptureMode):
+    name = 'stereo'
+    client_script = 'Stereo_client.py'
+    single_shot = True
+
+    def __init__(self, folder='Stereo', timeout=30.0):
+        super().__init__(folder)
+        self.timeout = timeout
+
+    def prepare(self, session):
+        os.makedirs(self.folder, exist_ok=True)
+
+    def retrieve(self, session):
+        for cam_num in session.cam_nums:
+            cam_zip = os.path.join(self.folder, f'images{cam_num}.zip')
+            if self.wait_for_file(cam_zip):
+                extract_zip(cam_zip, self.folder)
+            else:
+                print(f"Error: ZIP file not found for camera {cam_num}: {cam_zip}")
+
+    # Wait until the file exists and its size stopped changing
+    def wait_for_file(self, path):
+        deadline = time.time() + self.timeout
+        previous_size = -1
+        while time.time() < deadline:
+            if os.path.exists(path):
+                size = os.path.getsize(path)
+                if size == previous_size:
+                    return True
+                previous_size = size
+            time.sleep(0.5)
+        return False
+
+class CaptureSession:
+    # launch='agent' waits agent_timeout seconds for the running agents and only starts Camera_agent.py
+    # on the cameras that did not connect; launch='script' starts the mode's client script on every camera;
+    # launch=None starts nothing (clients started by hand or simulated by Load_generator.py).
+    # thermal_policy='report' only prints the throttling predicted by the cameras; 'adapt' also lowers the
+    # frame rate of every camera (CADENCE) by the slowdown factor the camera asked for.
+    # capture_mode='file' acknowledges a frame once its JPEG is written, 'request' once the sensor delivered it
+    # (the cameras encode in the background and only the readout is on the trigger path), 'raw' too but the
+    # cameras write uncompressed YUV420 frames that the mode converts on the server after the transfer.
+    # buffer_count is the number of camera buffers, 0 for as many as fit in each camera's memory budget:
+    # more buffers let the encoding of a frame overlap the next captures at the cost of CMA memory.
+    def __init__(self, mode, width, height, exposure_time, delay, num_cameras=num_cameras, port=PORT,
+                 launch='agent', agent_timeout=5.0, thermal_policy='report', capture_mode='file', buffer_count=1):
+        self.mode = mode
+        self.width = width
+        self.height = height
+        self.exposure_time = exposure_time
+        self.delay = delay
+        self.cam_nums = list(range(1, num_cameras + 1))
+        self.port = port
+        self.launch = launch
+        self.agent_timeout = agent_timeout
+        self.thermal_policy = thermal_policy
+        self.capture_mode = capture_mode
+        self.buffer_count = buffer_count
+        # Minimum time between two triggers: the interval every camera can hold according to the latency model,
+        # so the cadence stays regular, raised by the thermal negotiation
+        self.model = load_model()
+        self.trigger_interval = 0.0
+        if self.model:
+            self.trigger_interval = self.model.trigger_interval(width, height, exposure_time, num_cameras, delay)
+        self.frame_period = None
+        self.last_trigger = None
+        self.trigger_id = 0  # Id of the last trigger sent
+        self.links = []
+        self.server_socket = None
+        self.transfer_socket = None
+        self.background = []
+        self.metrics = SessionMetrics()
+        self.metrics.trigger_interval = self.trigger_interval
+
+    def broadcast(self, message):
+        for link in self.links:
+            link.send(message)
+
+    # Listen, launch the missing clients, accept one connection per camera and send the settings
+    def open(self):
+        start_time = time.time()
+        self.mode.prepare(self)
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind(('0.0.0.0', self.port))
+        self.server_socket.listen(len(self.cam_nums))
+        self.server_socket.settimeout(1.0)
+        if self.mode.uses_transfer_socket:
+            self.transfer_socket = open_transfer_socket(len(self.cam_nums))
+        print('Waiting for client connections...')
+
+        launched = False
+        if self.launch == 'script' and self.mode.client_script:
+            threading.Thread(target=start_all_clients_simultaneously,
+                             args=(self.mode.client_script, self.cam_nums), daemon=True).start()
+            launched = True
+
+        while len(self.links) < len(self.cam_nums):
+            try:
+                client_socket, addr = self.server_socket.accept()
+            except socket.timeout:
+                if self.launch == 'agent' and not launched and time.time() - start_time > self.agent_timeout:
+                    missing = [cam_num for cam_num in self.cam_nums if cam_num not in self.connected()]
+                    print(f"No agent running on cameras {missing}, starting them...")
+                    threading.Thread(target=start_all_clients_simultaneously,
+                                     args=('Camera_agent.py', missing), daemon=True).start()
+                    launched = True
+                continue
+            client_socket.settimeout(None)
+            print(f'Connected to {addr}')
+            link = ClientLink(client_socket, int(addr[0].split('.')[-1]))
+            self.handshake(link)
+        self.links.sort(key=lambda link: link.cam_num)
+
+        self.broadcast(f'SETTINGS {self.width} {self.height} {self.exposure_time} {self.capture_mode} '
+                       f'{self.buffer_count}'.encode('utf-8'))
+        for link in self.links:
+            link.expect(b'CONFIGURED')
+        self.metrics.record_stage('connect', time.time() - start_time)
+
+    def connected(self):
+        return [link.cam_num for link in self.links]
+
+    # Request the session; the client answers with its camera number, whether it was already running and the
+    # size of its tmpfs (absent from older agents)
+    def handshake(self, link):
+        link.send(f'SESSION {self.mode.name} {self.mode.profile} {self.mode.transfer_mode}'.encode('utf-8'))
+        try:
+            _, cam_num, state, setup_time, *tmpfs = link.recv_line().decode('utf-8').split()
+        except (ConnectionError, ValueError) as e:
+            print(f"Error: invalid session handshake from camera {link.cam_num}: {e}")
+            link.close()
+            return
+        link.cam_num = int(cam_num)
+        if link.cam_num not in self.cam_nums or link.cam_num in self.connected():
+            print(f"Error: unexpected connection from camera {link.cam_num}, ignored.")
+            link.close()
+            return
+        self.links.append(link)
+        self.metrics.record_client_start(link.cam_num, state, float(setup_time), int(tmpfs[0]) if tmpfs else None)
+
+    # A camera predicts thermal throttling: report it, and with the 'adapt' policy slow every camera down
+    def throttle(self, link, line):
+        _, cam_num, seconds, factor = line.decode('utf-8').split()
+        time_to_throttle = None if seconds == '-' else float(seconds)
+        self.metrics.record_throttle(int(cam_num), time_to_throttle, float(factor))
+        prediction = "latency drift" if time_to_throttle is None else f"throttling in {time_to_throttle:.0f} s"
+        print(f"Warning: Camera {cam_num} predicts {prediction}.")
+        # Cameras warning about the same frames ask for the same interval, it is only sent once
+        if self.thermal_policy == 'adapt' and self.frame_period and self.frame_period * float(factor) > self.trigger_interval:
+            self.trigger_interval = self.frame_period * float(factor)
+            self.metrics.trigger_interval = self.trigger_interval
+            print(f"Lowering the frame rate of every camera to {1 / self.trigger_interval:.2f} fps.")
+            self.broadcast(f'CADENCE {self.trigger_interval:.6f}'.encode('utf-8'))
+
+    # Next acknowledgment of a camera, handling the notices sent before it
+    # Returns the acknowledgment and the trigger id it echoes (None for RAM_LOW or an agent without trigger ids)
+    def receive_ack(self, link):
+        while True:
+            line = link.recv_line()
+            if line.startswith(b'THROTTLE'):
+                self.throttle(link, line)
+            elif line.startswith(b'ANOMALY'):
+                _, cam_num, photo, error = line.decode('utf-8').split()
+                self.metrics.record_anomaly(int(cam_num), int(photo), float(error))
+                print(f"Anomaly: Camera {cam_num} photo {photo} capture time off by {error}%")
+            else:
+                fields = line.split()
+                return fields[0], int(fields[1]) if len(fields) > 1 else None
+
+    # Send one capture command and wait for every acknowledgment, return False to stop the capture
+    def trigger(self):
+        if self.last_trigger is not None:
+            self.frame_period = time.time() - self.last_trigger
+            remaining = self.last_trigger + self.trigger_interval - time.time()
+            if remaining > 0:
+                time.sleep(remaining)
+        self.last_trigger = time.time()
+        capture_time = time.time_ns() + int(self.delay * 1_000_000_000)
+        self.trigger_id += 1
+        take_photo_command = f'TAKE_PHOTO {self.trigger_id} {capture_time}'.encode('utf-8')
+
+        start_time = time.perf_counter()
+        self.broadcast(take_photo_command)
+        dispatch_time = time.perf_counter() - start_time
+
+        for link in self.links:
+            ack, trigger_id = self.receive_ack(link)
+            if ack == b'RAM_LOW':
+                print(f"Error: Camera {link.cam_num} has low RAM. Stop the capture.")
+                return False
+            if trigger_id is not None and trigger_id != self.trigger_id:
+                print(f"Error: Camera {link.cam_num} acknowledged trigger {trigger_id} instead of {self.trigger_id}.")
+                self.metrics.record_id_mismatch(link.cam_num, self.trigger_id, trigger_id)
+            if ack == b'PHOTO_FAILED':
+                print(f"Error: Camera {link.cam_num} failed to take the photo.")
+                self.metrics.record_failure(link.cam_num)
+            else:
+                self.metrics.record_ack(link.cam_num, self.trigger_id if trigger_id is None else trigger_id)
+        self.metrics.record_trigger(dispatch_time, time.perf_counter() - start_time - dispatch_time)
+        return True
+
+    # Trigger until the mode is done, the operator presses Ctrl+C or a client fails
+    def capture(self, max_frames=None):
+        print("Starting capture...")
+        self.metrics.capture_start = time.time()
+        try:
+            while self.trigger():
+                if self.mode.single_shot or (max_frames and len(self.metrics.ack_times) >= max_frames):
+                    break
+        except KeyboardInterrupt:
+            print("Stopping capture...")
+        except ConnectionError as e:
+            print(f"Error: {e}. Stopping capture.")
+        self.metrics.capture_end = time.time()
+
+    # Signal clients to stop recording and wait for each confirmation
+    # A camera that lost its connection is dropped from the rest of the session
+    def stop(self):
+        stopped = []
+        for link in self.links:
+            try:
+                link.send(b'STOP_RECORD')
+                link.expect(b'RECORDING_STOPPED')
+                stopped.append(link)
+            except (ConnectionError, OSError) as e:
+                print(f"Error: Camera {link.cam_num} did not stop cleanly: {e}")
+                link.close()
+        self.links = stopped
+        print("All clients have stopped recording.")
+
+    def close(self):
+        for link in self.links:
+            link.close()
+        if self.transfer_socket:
+            self.transfer_socket.close()
+        if self.server_socket:
+            self.server_socket.close()
+        print('Connections closed.')
+
+    def timed(self, name, function, *args):
+        start_time = time.time()
+        try:
+            return function(*args)
+        finally:
+            self.metrics.record_stage(name, time.time() - start_time)
+
+    # Full session: connect, wait for the operator, capture, stop, retrieve
+    def run(self, max_frames=None, wait_for_operator=True):
+        try:
+            self.open()
+            if wait_for_operator:
+                input("Press Enter to start capturing images: ")
+            self.capture(max_frames)
+            self.timed('stop', self.stop)
+            self.timed('retrieve', self.mode.retrieve, self)
+        finally:
+            self.close()
+            for process in self.background:
+                process.join()
+        self.timed('process', self.mode.process, self)
+        self.metrics.report()
+        if self.model:
+            self.model.update_dispatch(self.metrics, len(self.cam_nums))  # Measured dispatch for the next safe delays
+            self.model.update_tmpfs(self.metrics)  # Reported tmpfs for the next capacity plans
+            self.model.save()
+        return self.metrics
@@ -0,0 +1,146 @@
+import os
+import sys
+import threading
+import numpy as np
+import pandas as pd
+import paramiko
+from Capture_session import camera_credentials, receive_scp, num_cameras
+
+# Runs the same capture-time sweep on every camera at once, collects the per-camera CSV files into one
+# dataset and computes a performance fingerprint per camera. The adaptive sweep does not measure the same
+# points on every camera, so each camera is compared through its fitted line, capture time = base + slope
+# * pixels, evaluated at reference resolutions. A camera whose fingerprint is far above the fleet median
+# (modified z-score over MAD_THRESHOLD, and SLOWER_THRESHOLD slower) is flagged: on identical hardware
+# and settings this points to the SD card, the cooling or the firmware of that camera.
+# The camera agent (Client/Camera_agent.py) keeps the camera open between sessions, so it is stopped on a
+# camera for the time of its sweep and started again afterwards; run the fleet benchmark between sessions.
+
+FLEET_FOLDER = 'Fleet'
+REFERENCE_RESOLUTIONS = [(640, 480), (1920, 1080), (4056, 3040)]
+MAD_THRESHOLD = 3.5
+SLOWER_THRESHOLD = 0.05
+AGENT_SCRIPT = 'Camera_agent.py'
+AGENT_PATTERN = '[C]amera_agent.py'  # Does not match the command line of the shell running pgrep or pkill
+
+# Run a command over SSH and wait for it to finish, return its exit status
+def run_remote(cam_num, command):
+    ip, username, password = camera_credentials(cam_num)
+    ssh = paramiko.SSHClient()
+    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    try:
+        ssh.connect(ip, username=username, password=password)
+        _, stdout, _ = ssh.exec_command(command)
+        return stdout.channel.recv_exit_status()
+    finally:
+        ssh.close()
+
+# Stop the camera agent of a camera and wait until it has released the camera; returns True if one was running
+def stop_agent(cam_num):
+    if run_remote(cam_num, f"pgrep -f '{AGENT_PATTERN}'"):
+        return False
+    run_remote(cam_num, f"sudo pkill -f '{AGENT_PATTERN}'; while pgrep -f '{AGENT_PATTERN}'; do sleep 0.1; done")
+    return True
+
+# Start the camera agent again in the background, it reopens the camera for the next sessions
+def start_agent(cam_num, client_folder):
+    run_remote(cam_num, f'cd {client_folder} && nohup sudo python3 {AGENT_SCRIPT} > /dev/null 2>&1 &')
+
+# Start the sweep on every camera at the same time and fetch each result file
+# Returns the cameras whose sweep or transfer failed
+def dispatch_sweep(cam_nums, script='TimeCapture.py', results_file='capture_results.csv', folder=FLEET_FOLDER):
+    os.makedirs(folder, exist_ok=True)
+    failed = []
+
+    def sweep(cam_num):
+        client_folder = f'/home/admin{cam_num}/Documents/Client'
+        agent_stopped = False
+        try:
+            agent_stopped = stop_agent(cam_num)
+            if agent_stopped:
+                print(f"Camera {cam_num}: agent stopped for the sweep")
+            status = run_remote(cam_num, f'cd {client_folder} && sudo python3 {script}')
+            if status:
+                raise RuntimeError(f"{script} exited with status {status}")
+            receive_scp(cam_num, f'{client_folder}/{results_file}', os.path.join(folder, f'sweep_cam_{cam_num:02d}.csv'))
+        except Exception as e:
+            print(f"Error: sweep of Camera {cam_num} failed: {e}")
+            failed.append(cam_num)
+        finally:
+            if agent_stopped:
+                try:
+                    start_agent(cam_num, client_folder)
+                except Exception as e:
+                    print(f"Error: agent of Camera {cam_num} could not be restarted: {e}")
+
+    threads = [threading.Thread(target=sweep, args=(cam_num,)) for cam_num in cam_nums]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return failed
+
+# Merge the per-camera sweep files of a folder into one dataset with a Camera column
+def collect_results(folder=FLEET_FOLDER, output_file='fleet_results.csv'):
+    frames = []
+    for name in sorted(os.listdir(folder)):
+        if name.startswith('sweep_cam_') and name.endswith('.csv'):
+            df = pd.read_csv(os.path.join(folder, name))
+            df.insert(0, 'Camera', int(name[len('sweep_cam_'):-len('.csv')]))
+            frames.append(df)
+    results = pd.concat(frames, ignore_index=True)
+    results.to_csv(os.path.join(folder, output_file), index=False)
+    return results
+
+# Per-camera fingerprint: fitted base time and time per megapixel, the time at the reference resolutions,
+# the JPEG bytes per pixel and the share of points whose confidence interval did not converge
+def fingerprints(results):
+    rows = []
+    for cam_num, group in results.groupby('Camera'):
+        pixels = group['Pixel count'].to_numpy(np.float64)
+        times = group['Average time (s)'].to_numpy()
+        slope, base = np.polyfit(pixels, times, 1) if len(group) > 1 else (times[0] / pixels[0], 0.0)
+        row = {'Camera': cam_num, 'base_ms': base * 1000, 'ms_per_megapixel': slope * 1e9}
+        for width, height in REFERENCE_RESOLUTIONS:
+            row[f'{width}x{height}_ms'] = (base + slope * width * height) * 1000
+        if 'Average size (bytes)' in group:
+            row['bytes_per_pixel'] = group['Average size (bytes)'].sum() / pixels.sum()
+        if 'Converged' in group:
+            row['unconverged'] = 1 - group['Converged'].mean()
+        rows.append(row)
+    return pd.DataFrame(rows).set_index('Camera')
+
+# Cameras systematically slower than the fleet on a reference resolution, as {camera: [reasons]}
+def flag_cameras(prints, mad_threshold=MAD_THRESHOLD, slower_threshold=SLOWER_THRESHOLD):
+    flagged = {}
+    for column in [f'{width}x{height}_ms' for width, height in REFERENCE_RESOLUTIONS]:
+        values = prints[column]
+        median = values.median()
+        mad = (values - median).abs().median()
+        if not mad:
+            mad = 1e-9
+        scores = 0.6745 * (values - median) / mad  # Modified z-score (Iglewicz and Hoaglin)
+        for cam_num in values.index:
+            if scores[cam_num] > mad_threshold and values[cam_num] > median * (1 + slower_threshold):
+                flagged.setdefault(cam_num, []).append(
+                    f"{column[:-3]} {values[cam_num]:.1f} ms vs fleet median {median:.1f} ms")
+    return flagged
+
+def report(prints, flagged):
+    print(prints.round(3).to_string())
+    if not flagged:
+        print("No camera is systematically slower than the fleet.")
+    for cam_num, reasons in flagged.items():
+        print(f"Camera {cam_num} flagged for replacement: " + "; ".join(reasons))
+
+# Usage: python Fleet_benchmark.py [script] [results_file]   e.g. TimeCaptureWidths.py capture_results.csv
+#        python Fleet_benchmark.py --collect                 (analyse the files already in Fleet/)
+if __name__ == '__main__':
+    if '--collect' not in sys.argv:
+        script = sys.argv[1] if len(sys.argv) > 1 else 'TimeCapture.py'
+        results_file = sys.argv[2] if len(sys.argv) > 2 else 'capture_results.csv'
+        failed = dispatch_sweep(list(range(1, num_cameras + 1)), script, results_file)
+        if failed:
+            print(f"No results from cameras {failed}")
+    prints = fingerprints(collect_results())
+    prints.to_csv(os.path.join(FLEET_FOLDER, 'fleet_fingerprints.csv'))
+    report(prints, flag_cameras(prints))
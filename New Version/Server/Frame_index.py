@@ -0,0 +1,185 @@
+import os
+import re
+import csv
+import sys
+import glob
+import struct
+import zipfile
+import multiprocessing
+import numpy as np
+from Frame_receiver import FrameContainer, CONTAINER_NAME
+from Raw_converter import RAW_HEADER_FORMAT, RAW_MAGIC, RAW_EXTENSION
+
+# Ingestion of a retrieved session: every camera folder (Cam_XX) is processed by a worker of a process
+# pool. A ZIP archive (scp transfer) is extracted, a frame container (sendfile transfer) is left as is
+# since its frames can be read in place. Every frame is checked (JPEG start and end markers, raw frame
+# header and size) and one index of the session is written as frame_index.npz, one row per frame:
+#   camera, frame (number of the file name: the trigger id, or the photo count of an agent without ids),
+#   trigger_id, trigger and timestamp (trigger id, trigger time and exposure start in ns since the epoch from
+#   the camera's metadata file, 0 if unknown), anomaly (latency anomaly streamed during the capture), offset
+#   and size of the frame in its source, valid, and the frame name.
+# FrameIndex loads it and finds a frame of every camera with a table lookup, without scanning folders.
+
+INDEX_NAME = 'frame_index.npz'
+ZIP_NAME = 'images.zip'
+FRAME_NAME = re.compile(r'img(\d+)\.(jpg|raw)$')
+METADATA_NAME = re.compile(r'metadata\d+\.csv$')
+
+HEAD_SIZE = 64  # Bytes read at the start of a frame, enough for the raw frame header
+
+# JPEG start of image at the beginning and end of image at the end (no truncated transfer or write)
+def is_valid_jpeg(head, tail, size):
+    return size >= 4 and head[:2] == b'\xff\xd8' and tail == b'\xff\xd9'
+
+# Raw frame header, and a size covering the YUV420 planes it announces
+def is_valid_raw(head, size):
+    header_size = struct.calcsize(RAW_HEADER_FORMAT)
+    if size < header_size:
+        return False
+    magic, _, _, _, height, stride = struct.unpack_from(RAW_HEADER_FORMAT, head, 0)
+    return magic == RAW_MAGIC and size >= header_size + stride * height * 3 // 2
+
+# Only the first and last bytes of a frame are read, the check costs the same for any frame size
+def is_valid_frame(name, head, tail, size):
+    if name.endswith(f'.{RAW_EXTENSION}'):
+        return is_valid_raw(head, size)
+    return is_valid_jpeg(head, tail, size)
+
+# Trigger id, trigger time and exposure start per frame number from the per-frame metadata file written by
+# the camera agent; files written before the trigger ids have neither the column nor ids in the frame names
+def parse_metadata(text):
+    timestamps = {}
+    for row in csv.DictReader(text.splitlines()):
+        trigger_id = int(row.get('trigger_id') or 0)
+        timestamps[trigger_id or int(row['photo'])] = (trigger_id, int(row['trigger_ns'] or 0),
+                                                       int(row['exposure_start_ns'] or 0))
+    return timestamps
+
+# Pool task: extract and check the frames of one camera folder
+# Returns (camera, source, rows) with rows = [(frame, trigger_id, trigger, timestamp, offset, size, valid, name)]
+def ingest_camera(job):
+    cam_num, camera_folder = job
+    zip_path = os.path.join(camera_folder, ZIP_NAME)
+    if os.path.exists(zip_path):
+        with zipfile.ZipFile(zip_path) as zipf:
+            zipf.extractall(camera_folder)
+        os.remove(zip_path)
+
+    frames = []  # (frame, offset, size, valid, name)
+    metadata = ''
+    container_path = os.path.join(camera_folder, CONTAINER_NAME)
+    if os.path.exists(container_path):
+        source = container_path
+        with FrameContainer(container_path) as container:
+            for name, (offset, size) in container.index.items():
+                if METADATA_NAME.match(name):
+                    metadata = bytes(container.read(name)).decode('utf-8')
+                elif FRAME_NAME.match(name):
+                    head = container.map[offset:offset + min(HEAD_SIZE, size)]
+                    tail = container.map[offset + size - 2:offset + size] if size >= 2 else b''
+                    frames.append((int(FRAME_NAME.match(name).group(1)), offset, size,
+                                   is_valid_frame(name, head, tail, size), name))
+    else:
+        source = camera_folder
+        with os.scandir(camera_folder) as entries:
+            for entry in entries:
+                if METADATA_NAME.match(entry.name):
+                    with open(entry.path) as file:
+                        metadata = file.read()
+                elif FRAME_NAME.match(entry.name):
+                    size = entry.stat().st_size
+                    with open(entry.path, 'rb') as file:
+                        head = file.read(HEAD_SIZE)
+                        file.seek(max(size - 2, 0))
+                        tail = file.read(2)
+                    frames.append((int(FRAME_NAME.match(entry.name).group(1)), 0, size,
+                                   is_valid_frame(entry.name, head, tail, size), entry.name))
+
+    timestamps = parse_metadata(metadata) if metadata else {}
+    rows = [(frame, *timestamps.get(frame, (0, 0, 0)), offset, size, valid, name) for frame, offset, size, valid, name in frames]
+    return cam_num, source, rows
+
+INDEX_FIELDS = (('camera', np.int16), ('frame', np.int32), ('trigger_id', np.int64), ('trigger', np.int64),
+                ('timestamp', np.int64), ('anomaly', bool), ('offset', np.int64), ('size', np.int64), ('valid', bool),
+                ('name', str))
+
+# Ingest every camera folder of a session in parallel and write the index
+# anomalies: {camera: [(photo, error %)]} as streamed during the capture (SessionMetrics.anomalies)
+def ingest_session(folder, anomalies=None, processes=None):
+    jobs = [(int(os.path.basename(path)[len('Cam_'):]), path) for path in sorted(glob.glob(os.path.join(folder, 'Cam_*')))]
+    if not jobs:
+        return None
+    with multiprocessing.Pool(min(processes or os.cpu_count(), len(jobs))) as pool:
+        results = pool.map(ingest_camera, jobs)
+
+    anomalous = {(cam_num, photo) for cam_num, photos in (anomalies or {}).items() for photo, _ in photos}
+    rows = [(cam_num, frame, trigger_id, trigger, timestamp, (cam_num, frame) in anomalous, offset, size, valid, name)
+            for cam_num, _, camera_rows in results
+            for frame, trigger_id, trigger, timestamp, offset, size, valid, name in camera_rows]
+    rows.sort(key=lambda row: (row[1], row[0]))  # By frame, then camera
+    columns = list(zip(*rows)) if rows else [()] * len(INDEX_FIELDS)
+    index = {name: np.array(column, dtype=dtype) for (name, dtype), column in zip(INDEX_FIELDS, columns)}
+    index['source_camera'] = np.array([cam_num for cam_num, _, _ in results], dtype=np.int16)
+    index['source'] = np.array([os.path.relpath(source, folder) for _, source, _ in results], dtype=str)
+    index_path = os.path.join(folder, INDEX_NAME)
+    np.savez(index_path, **index)
+
+    invalid = ~index['valid']
+    print(f"Index of {len(rows)} frames from {len(results)} cameras saved in {index_path}"
+          + (f", {int(invalid.sum())} corrupted frames:" if invalid.any() else "."))
+    for cam_num, frame in zip(index['camera'][invalid], index['frame'][invalid]):
+        print(f"  Camera {cam_num}, frame {frame}")
+    return index_path
+
+# Frame index of a session: rows[frame position, camera position] is the row of a frame, -1 if missing
+class FrameIndex:
+    def __init__(self, folder):
+        self.folder = folder
+        with np.load(os.path.join(folder, INDEX_NAME)) as data:
+            self.fields = {name: data[name] for name in data.files}
+        self.cameras = self.fields['source_camera']
+        self.sources = dict(zip(self.cameras.tolist(), self.fields['source'].tolist()))
+        frames = self.fields['frame']
+        self.frame_position = np.full(int(frames.max()) + 1 if frames.size else 0, -1, dtype=np.int64)
+        unique_frames = np.unique(frames)
+        self.frame_position[unique_frames] = np.arange(len(unique_frames))
+        self.rows = np.full((len(unique_frames), len(self.cameras)), -1, dtype=np.int64)
+        self.rows[self.frame_position[frames], np.searchsorted(self.cameras, self.fields['camera'])] = np.arange(frames.size)
+        self.containers = {}
+
+    def __len__(self):
+        return self.fields['frame'].size
+
+    # Rows of one frame for every camera (-1 where the camera has no such frame)
+    def lookup(self, frame):
+        if frame >= len(self.frame_position) or self.frame_position[frame] < 0:
+            return np.full(len(self.cameras), -1, dtype=np.int64)
+        return self.rows[self.frame_position[frame]]
+
+    # Value of an index field for a row, e.g. index.field('timestamp', row)
+    def field(self, name, row):
+        return self.fields[name][row]
+
+    # Bytes of the frame of a row, read from its container or its extracted file
+    def read(self, row):
+        camera = int(self.fields['camera'][row])
+        source = os.path.join(self.folder, self.sources[camera])
+        if source.endswith(CONTAINER_NAME):
+            if source not in self.containers:
+                self.containers[source] = FrameContainer(source)
+            offset, size = int(self.fields['offset'][row]), int(self.fields['size'][row])
+            return self.containers[source].map[offset:offset + size]
+        with open(os.path.join(source, str(self.fields['name'][row])), 'rb') as file:
+            return file.read()
+
+    def close(self):
+        for container in self.containers.values():
+            container.close()
+        self.containers = {}
+
+# Usage: python Frame_index.py <session folder>   (ingest the Cam_XX folders and write frame_index.npz)
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python Frame_index.py <session folder>")
+        sys.exit(1)
+    ingest_session(sys.argv[1])
@@ -0,0 +1,180 @@
+import os
+import sys
+import mmap
+import socket
+import struct
+import threading
+
+# Must match the container format written by Client/Frame_transfer.py
+CONTAINER_MAGIC = b'CRPF'
+CONTAINER_VERSION = 1
+HEADER_FORMAT = '<4sHI'   # magic, version, frame count
+ENTRY_FORMAT = '<QQH'     # frame offset, frame size, name length (name bytes follow)
+
+TRANSFER_PORT = 5001
+CONTAINER_NAME = 'frames.crpf'
+CHUNK_SIZE = 1024 * 1024
+
+# Receive exactly size bytes from a socket
+def recv_exact(conn, size):
+    data = bytearray(size)
+    view = memoryview(data)
+    received = 0
+    while received < size:
+        count = conn.recv_into(view[received:], size - received)
+        if count == 0:
+            raise ConnectionError("Connection closed before the container was complete")
+        received += count
+    return bytes(data)
+
+# Parse the index of a container from a buffer, return {name: (offset, size)}
+def parse_index(buffer):
+    magic, version, frame_count = struct.unpack_from(HEADER_FORMAT, buffer, 0)
+    if magic != CONTAINER_MAGIC or version != CONTAINER_VERSION:
+        raise ValueError("Not a CaptuRPi frame container")
+    position = struct.calcsize(HEADER_FORMAT)
+    entry_size = struct.calcsize(ENTRY_FORMAT)
+    index = {}
+    for _ in range(frame_count):
+        offset, size, name_length = struct.unpack_from(ENTRY_FORMAT, buffer, position)
+        position += entry_size
+        name = bytes(buffer[position:position + name_length]).decode('utf-8')
+        position += name_length
+        index[name] = (offset, size)
+    return index
+
+# Receive one container from a data connection and store it as-is on disk
+def receive_container(conn, path):
+    prefix = recv_exact(conn, struct.calcsize(HEADER_FORMAT))
+    magic, version, frame_count = struct.unpack(HEADER_FORMAT, prefix)
+    if magic != CONTAINER_MAGIC or version != CONTAINER_VERSION:
+        raise ValueError("Not a CaptuRPi frame container")
+
+    entries = []
+    for _ in range(frame_count):
+        entry = recv_exact(conn, struct.calcsize(ENTRY_FORMAT))
+        name_length = struct.unpack(ENTRY_FORMAT, entry)[2]
+        entries.append(entry + recv_exact(conn, name_length))
+    header = prefix + b''.join(entries)
+
+    remaining = sum(struct.unpack_from(ENTRY_FORMAT, entry)[1] for entry in entries)
+    total_bytes = len(header) + remaining
+    buffer = bytearray(CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(path, 'wb') as file:
+        file.write(header)
+        while remaining > 0:
+            count = conn.recv_into(view, min(CHUNK_SIZE, remaining))
+            if count == 0:
+                raise ConnectionError("Connection closed before the container was complete")
+            file.write(view[:count])
+            remaining -= count
+    return total_bytes
+
+# Accept one data connection per camera and receive all containers in parallel
+# cam_addresses maps the IP address of each camera's control connection to its camera number
+# Returns {cam_num: bytes received} for the cameras whose container arrived complete;
+# a camera that does not connect or stalls for longer than timeout seconds is left out
+def receive_all_containers(transfer_socket, local_folder, cam_addresses, timeout=60.0):
+    results = {}
+    threads = []
+
+    def receive(conn, cam_num):
+        path = os.path.join(local_folder, f'Cam_{cam_num:02d}', CONTAINER_NAME)
+        try:
+            conn.settimeout(timeout)
+            results[cam_num] = receive_container(conn, path)
+            print(f"Frames for Camera {cam_num} received and saved at {path}.")
+        except (OSError, ValueError) as e:
+            print(f"Error receiving frames from Camera {cam_num}: {e}")
+        finally:
+            conn.close()
+
+    expected = dict(cam_addresses)
+    transfer_socket.settimeout(timeout)
+    try:
+        while expected:
+            conn, addr = transfer_socket.accept()
+            cam_num = expected.pop(addr[0], None)
+            if cam_num is None:
+                conn.close()
+                continue
+            thread = threading.Thread(target=receive, args=(conn, cam_num))
+            threads.append(thread)
+            thread.start()
+    except socket.timeout:
+        print(f"Error: no frame transfer connection from cameras {sorted(expected.values())}.")
+    finally:
+        transfer_socket.settimeout(None)
+
+    for thread in threads:
+        thread.join()
+    return results
+
+# Open the listening socket used for frame transfers
+def open_transfer_socket(num_cameras, port=TRANSFER_PORT):
+    transfer_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    transfer_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    transfer_socket.bind(('0.0.0.0', port))
+    transfer_socket.listen(num_cameras)
+    return transfer_socket
+
+# Read-only view of a received container; frames are sliced lazily out of a memory map
+class FrameContainer:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.index = parse_index(self.map)
+
+    def names(self):
+        return list(self.index)
+
+    # Return the bytes of one frame without reading the rest of the container
+    def read(self, name):
+        offset, size = self.index[name]
+        return self.map[offset:offset + size]
+
+    # Write one frame to disk
+    def extract(self, name, destination_folder):
+        path = os.path.join(destination_folder, name)
+        with open(path, 'wb') as file:
+            file.write(self.read(name))
+        return path
+
+    def extract_all(self, destination_folder):
+        return [self.extract(name, destination_folder) for name in self.index]
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.index)
+
+# Extract every frame of a received container next to it or into destination_folder
+def extract_container(path, destination_folder=None):
+    destination_folder = destination_folder or os.path.dirname(path)
+    os.makedirs(destination_folder, exist_ok=True)
+    with FrameContainer(path) as container:
+        return container.extract_all(destination_folder)
+
+# Usage: python Frame_receiver.py <container> [destination_folder]
+# Lists the frames of the container, or extracts them when a destination folder is given
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python Frame_receiver.py <container> [destination_folder]")
+        sys.exit(1)
+    if len(sys.argv) > 2:
+        paths = extract_container(sys.argv[1], sys.argv[2])
+        print(f"{len(paths)} frames extracted into {sys.argv[2]}")
+    else:
+        with FrameContainer(sys.argv[1]) as container:
+            for name, (offset, size) in container.index.items():
+                print(f"{name}\t{size} bytes at offset {offset}")
@@ -0,0 +1,135 @@
+import os
+import sys
+import heapq
+import numpy as np
+from Frame_index import FrameIndex
+
+# Groups the frames of a session into synchronized sets, one frame per camera and per trigger, for the
+# stereo and DIC processing. The frames are matched on what the cameras share, the first key every frame has:
+#   - the trigger id of TAKE_PHOTO, also the frame number of the file names (frame metadata, Frame_index.py);
+#   - the trigger time of TAKE_PHOTO, for sessions recorded before the trigger ids, whose frame numbers are
+#     per-camera counters shifted by every command a camera missed;
+#   - without it, the exposure start: frames closer than the tolerance (half the trigger period by
+#     default) are one set.
+# The frames of a camera are in capture order; the per-camera streams are merged (heapq.merge) and cut into
+# sets in a single pass, O(total frames x log cameras). A set is complete when it holds a frame of every
+# camera; an incomplete set is kept and marked, so a dropped frame only costs its own set.
+# The sets are saved as frame_sets.npz: key (trigger id, trigger time or exposure start in ns), rows
+# (sets x cameras, rows of the frame index, -1 where a camera has no frame), complete, spread (exposure start
+# range, ns).
+# Sets keyed on trigger ids are verified against the ids every camera acknowledged during the capture.
+
+SETS_NAME = 'frame_sets.npz'
+KEYS = ('trigger_id', 'trigger')  # Exact keys, in order of preference, before the exposure start
+
+# Half the median period between two exposure starts of a camera
+def default_tolerance(index):
+    periods = []
+    for cam_num in index.cameras:
+        timestamps = np.sort(index.fields['timestamp'][(index.fields['camera'] == cam_num) & (index.fields['timestamp'] > 0)])
+        periods.append(np.diff(timestamps))
+    periods = np.concatenate(periods) if periods else np.array([])
+    return int(np.median(periods) / 2) if periods.size else 0
+
+# Match the frames of an index into sets
+def assemble(index, tolerance=None):
+    fields = index.fields
+    keyed_on = next((name for name in KEYS if name in fields and len(index) and (fields[name] > 0).all()), 'timestamp')
+    keys = fields[keyed_on]
+    tolerance = 0 if keyed_on in KEYS else (tolerance or default_tolerance(index))
+
+    streams = []
+    for position, cam_num in enumerate(index.cameras):
+        rows = np.nonzero((fields['camera'] == cam_num) & (keys > 0))[0]
+        rows = rows[np.argsort(keys[rows], kind='stable')]  # Already in capture order, a linear pass
+        streams.append(zip(keys[rows].tolist(), [position] * len(rows), rows.tolist()))
+
+    set_keys, set_rows = [], []
+    current = None
+    for key, position, row in heapq.merge(*streams):
+        # A new set starts past the tolerance, or when the camera already has a frame in the current one
+        if current is None or key - set_keys[-1] > tolerance or current[position] >= 0:
+            current = [-1] * len(index.cameras)
+            set_keys.append(key)
+            set_rows.append(current)
+        current[position] = row
+
+    rows = np.array(set_rows, dtype=np.int64).reshape(len(set_rows), len(index.cameras))
+    present = rows >= 0
+    timestamps = np.where(present, fields['timestamp'][np.maximum(rows, 0)], 0)
+    known = present & (timestamps > 0)
+    first = np.where(known, timestamps, np.iinfo(np.int64).max).min(axis=1)
+    last = np.where(known, timestamps, 0).max(axis=1)
+    spread = np.where(known.any(axis=1), last - first, 0)
+    return {
+        'key': np.array(set_keys, dtype=np.int64),
+        'rows': rows,
+        'complete': present.all(axis=1),
+        'spread': spread,
+        'cameras': index.cameras,
+        'keyed_on': np.array(keyed_on),
+        'unmatched': np.array(len(index) - int(present.sum())),
+    }
+
+def report(sets):
+    complete = sets['complete']
+    print(f"Frame sets matched on the {sets['keyed_on']}: {int(complete.sum())} complete, "
+          f"{int((~complete).sum())} incomplete" + (f", {int(sets['unmatched'])} frames without timestamp"
+                                                    if sets['unmatched'] else ""))
+    missing = (sets['rows'] < 0).sum(axis=0)
+    for cam_num, count in zip(sets['cameras'], missing):
+        if count:
+            print(f"  Camera {cam_num}: missing from {count} sets")
+    if complete.any():
+        spread_ms = sets['spread'][complete] / 1e6
+        print(f"  Exposure start spread in complete sets: median {np.median(spread_ms):.2f} ms, "
+              f"max {spread_ms.max():.2f} ms")
+
+# Check sets keyed on trigger ids against the ids acknowledged by every camera ({camera: [trigger id]},
+# SessionMetrics.acknowledged) and against the trigger times of their frames
+# Returns {camera: (acknowledged ids without a frame, frames never acknowledged)} and the ids of the sets
+# whose frames were not triggered at the same time
+def verify(sets, index, acknowledged):
+    mismatches = {}
+    for position, cam_num in enumerate(sets['cameras'].tolist()):
+        present = set(sets['key'][sets['rows'][:, position] >= 0].tolist())
+        expected = set(acknowledged.get(cam_num, []))
+        if present != expected:
+            mismatches[cam_num] = (sorted(expected - present), sorted(present - expected))
+    rows = sets['rows']
+    triggers = np.where(rows >= 0, index.fields['trigger'][np.maximum(rows, 0)], 0)
+    first = np.where(triggers > 0, triggers, np.iinfo(np.int64).max).min(axis=1)
+    conflicts = sets['key'][(triggers.max(axis=1) > first)].tolist()
+
+    for cam_num, (lost, unexpected) in mismatches.items():
+        if lost:
+            print(f"Error: Camera {cam_num} acknowledged triggers without a frame: {lost}")
+        if unexpected:
+            print(f"Error: Camera {cam_num} has frames of triggers it did not acknowledge: {unexpected}")
+    if conflicts:
+        print(f"Error: frames with different trigger times in the sets of triggers {conflicts}")
+    if not mismatches and not conflicts:
+        print("Frame sets verified against the acknowledged trigger ids.")
+    return mismatches, conflicts
+
+# Assemble the sets of a session folder from its frame index, save and report them
+# acknowledged: trigger ids acknowledged per camera, to verify sets keyed on trigger ids
+def assemble_session(folder, tolerance=None, acknowledged=None):
+    index = FrameIndex(folder)
+    sets = assemble(index, tolerance)
+    np.savez(os.path.join(folder, SETS_NAME), **sets)
+    report(sets)
+    if acknowledged is not None and sets['keyed_on'] == 'trigger_id':
+        verify(sets, index, acknowledged)
+    return sets
+
+def load_sets(folder):
+    with np.load(os.path.join(folder, SETS_NAME)) as data:
+        return {name: data[name] for name in data.files}
+
+# Usage: python Frame_sets.py <session folder> [tolerance ms]   (the session must be indexed, Frame_index.py)
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python Frame_sets.py <session folder> [tolerance ms]")
+        sys.exit(1)
+    assemble_session(sys.argv[1], int(float(sys.argv[2]) * 1e6) if len(sys.argv) > 2 else None)
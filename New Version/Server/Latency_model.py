@@ -0,0 +1,154 @@
+import os
+import sys
+import json
+import numpy as np
+import pandas as pd
+
+# Capture-latency model fitted on the TimeCapture sweeps, stored as JSON next to the server scripts and
+# loaded by the capture session to choose the trigger timing instead of asking the operator to guess:
+#   capture time = f(pixels) + g(exposure) - g(sweep exposure)
+# f and g are continuous piecewise-linear functions. The knots are added greedily among the measured
+# points while they improve the Bayesian information criterion (a knot costs two parameters, its position
+# and its slope change), so a regime change (buffer reallocation, sensor mode switch) gets its own
+# segment and the noise of a linear region does not.
+#   safe delay       = dispatch time per camera * cameras + wake margin (command received before the trigger)
+#   trigger interval = safe delay + upper bound of the capture time + acknowledgment overhead
+# The sessions also store the smallest tmpfs the cameras reported, for the capacity planner.
+
+MODEL_FILE = 'latency_model.json'
+DISPATCH_PER_CAMERA = 0.0005  # Seconds to send TAKE_PHOTO to one camera, updated from the session metrics
+WAKE_MARGIN = 0.010           # Scheduler wake-up and the archive or spill chunk being written on the camera
+ACK_OVERHEAD = 0.002
+UPPER_SIGMA = 3.0             # Capture-time bound: prediction + UPPER_SIGMA residual standard deviations
+
+# Continuous piecewise-linear least-squares fit, returned as breakpoints (xs, ys)
+def fit_piecewise(x, y, max_knots=4):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    order = np.argsort(x)
+    x, y = x[order], y[order]
+    if len(x) < 2 or x[0] == x[-1]:
+        return [float(x.min())], [float(y.mean())]
+
+    def solve(knots):
+        basis = np.column_stack([np.ones_like(x), x] + [np.maximum(x - knot, 0.0) for knot in knots])
+        coefficients, _, _, _ = np.linalg.lstsq(basis, y, rcond=None)
+        return coefficients, float(np.sum((basis @ coefficients - y) ** 2))
+
+    knots = []
+    coefficients, error = solve(knots)
+    candidates = list(np.unique(x[1:-1]))
+    while len(knots) < max_knots and candidates:
+        best = min(candidates, key=lambda knot: solve(sorted(knots + [knot]))[1])
+        best_coefficients, best_error = solve(sorted(knots + [best]))
+        if error <= 0 or len(x) * np.log(max(best_error, 1e-30) / error) + 2 * np.log(len(x)) >= 0:
+            break
+        knots = sorted(knots + [best])
+        candidates.remove(best)
+        coefficients, error = best_coefficients, best_error
+
+    xs = [float(x[0])] + [float(knot) for knot in knots] + [float(x[-1])]
+    ys = [float(coefficients[0] + coefficients[1] * value +
+                sum(c * max(value - knot, 0.0) for c, knot in zip(coefficients[2:], knots))) for value in xs]
+    return xs, ys
+
+# Evaluate breakpoints, extrapolating linearly beyond the first and last segments
+def evaluate_piecewise(xs, ys, value):
+    if len(xs) == 1:
+        return ys[0]
+    if value < xs[0]:
+        return ys[0] + (value - xs[0]) * (ys[1] - ys[0]) / (xs[1] - xs[0])
+    if value > xs[-1]:
+        return ys[-1] + (value - xs[-1]) * (ys[-1] - ys[-2]) / (xs[-1] - xs[-2])
+    return float(np.interp(value, xs, ys))
+
+class LatencyModel:
+    def __init__(self, pixels, exposure, sweep_exposure, residual_std, bytes_per_pixel,
+                 dispatch_per_camera=DISPATCH_PER_CAMERA, tmpfs_bytes=None):
+        self.pixels = pixels                  # (xs, ys): capture time (s) against the pixel count
+        self.exposure = exposure              # (xs, ys): capture time (s) against the exposure (µs)
+        self.sweep_exposure = sweep_exposure  # Exposure of the pixel sweep
+        self.residual_std = residual_std
+        self.bytes_per_pixel = bytes_per_pixel
+        self.dispatch_per_camera = dispatch_per_camera
+        self.tmpfs_bytes = tmpfs_bytes        # Smallest tmpfs of the cameras in the last session, None before one
+
+    # Median capture time of one frame
+    def capture_time(self, width, height, exposure_time):
+        base = evaluate_piecewise(*self.pixels, width * height)
+        if len(self.exposure[0]) > 1:
+            return base + evaluate_piecewise(*self.exposure, exposure_time) - evaluate_piecewise(*self.exposure, self.sweep_exposure)
+        return base + (exposure_time - self.sweep_exposure) / 1e6  # Without an exposure sweep the exposure adds up
+
+    def capture_bound(self, width, height, exposure_time):
+        return self.capture_time(width, height, exposure_time) + UPPER_SIGMA * self.residual_std
+
+    def frame_size(self, width, height):
+        return self.bytes_per_pixel * width * height
+
+    # Shortest lead time that still reaches every camera before the trigger time
+    def safe_delay(self, num_cameras):
+        return self.dispatch_per_camera * num_cameras + WAKE_MARGIN
+
+    # Shortest period between two triggers every camera can hold at this setting
+    def trigger_interval(self, width, height, exposure_time, num_cameras, delay=None):
+        delay = self.safe_delay(num_cameras) if delay is None else delay
+        return delay + self.capture_bound(width, height, exposure_time) + ACK_OVERHEAD
+
+    # Keep the worst dispatch time per camera seen in a session for the next safe delays
+    def update_dispatch(self, metrics, num_cameras):
+        if metrics.dispatch_times:
+            self.dispatch_per_camera = max(self.dispatch_per_camera, max(metrics.dispatch_times) / num_cameras)
+
+    # Keep the smallest tmpfs reported by the cameras of the last session (it follows their available memory)
+    def update_tmpfs(self, metrics):
+        if metrics.tmpfs_sizes:
+            self.tmpfs_bytes = min(metrics.tmpfs_sizes.values())
+
+    def save(self, model_file=MODEL_FILE):
+        with open(model_file, 'w') as file:
+            json.dump(self.__dict__, file, indent=2)
+
+    @classmethod
+    def load(cls, model_file=MODEL_FILE):
+        with open(model_file) as file:
+            return cls(**json.load(file))
+
+# Model stored next to the server scripts, None before the first fit
+def load_model(model_file=MODEL_FILE):
+    return LatencyModel.load(model_file) if os.path.exists(model_file) else None
+
+# Fit the model on a resolution sweep and, if there is one, an exposure sweep at a fixed resolution
+def fit_model(sweep_csv, exposure_csv=None):
+    sweep = pd.read_csv(sweep_csv)
+    pixels = sweep['Pixel count'].to_numpy(np.float64)
+    times = sweep['Average time (s)'].to_numpy()
+    sweep_exposure = float(sweep['Exposure time (us)'].iloc[0]) if 'Exposure time (us)' in sweep else 10000.0
+    pixel_fit = fit_piecewise(pixels, times)
+    residuals = times - np.array([evaluate_piecewise(*pixel_fit, value) for value in pixels])
+    # Frame-to-frame spread: the sweep means around the fit, and the per-frame deviation behind each
+    # confidence interval (half-width of about 2 standard deviations / sqrt(samples))
+    spread = [float(np.std(residuals))]
+    if 'CI half-width (s)' in sweep:
+        spread.append(float((sweep['CI half-width (s)'] * np.sqrt(sweep['Samples']) / 2).max()))
+    exposure_fit = ([sweep_exposure], [0.0])
+    if exposure_csv:
+        exposures = pd.read_csv(exposure_csv)
+        column = 'Exposure time (us)' if 'Exposure time (us)' in exposures else 'Time Exposure (µs)'
+        exposure_fit = fit_piecewise(exposures[column].to_numpy(np.float64), exposures['Average time (s)'].to_numpy())
+    bytes_per_pixel = 0.3  # Speckle JPEGs of the HQ camera when the sweep has no sizes
+    if 'Average size (bytes)' in sweep:
+        bytes_per_pixel = float(sweep['Average size (bytes)'].sum() / pixels.sum())
+    return LatencyModel(pixel_fit, exposure_fit, sweep_exposure, max(spread), bytes_per_pixel)
+
+# Usage: python Latency_model.py capture_results.csv [capture_results_exposure.csv]
+# Fits the model, saves it as latency_model.json and prints the timing it gives for common settings
+if __name__ == '__main__':
+    model = fit_model(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    model.save()
+    print(f"Model saved in {MODEL_FILE}: {len(model.pixels[0]) - 1} pixel segment(s), "
+          f"{max(len(model.exposure[0]) - 1, 1)} exposure segment(s), residual {model.residual_std * 1000:.2f} ms")
+    for width, height in [(640, 480), (1920, 1080), (4056, 3040)]:
+        interval = model.trigger_interval(width, height, model.sweep_exposure, 12)
+        print(f"{width}x{height}: capture {model.capture_time(width, height, model.sweep_exposure) * 1000:.1f} ms, "
+              f"delay {model.safe_delay(12) * 1000:.1f} ms, interval {interval * 1000:.1f} ms ({1 / interval:.2f} fps)")
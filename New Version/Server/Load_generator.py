@@ -0,0 +1,238 @@
+import os
+import sys
+import json
+import time
+import socket
+import struct
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+import numpy as np
+
+CLIENT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Client')
+SRC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src')
+sys.path.append(CLIENT_FOLDER)
+sys.path.append(SRC_FOLDER)
+
+from Camera_agent import CameraAgent
+from Fake_camera import SimulatedCamera
+from message import Message
+from Capture_session import CaptureSession, ContinuousMode, PORT
+
+# Runs N simulated cameras on this machine and drives them with the real server code over loopback,
+# to measure throughput and synchronization without Raspberry Pis.
+#   engine mode: Camera_agent.py instances with a SimulatedCamera, driven by the capture-session engine
+#                (the Speckle_server path: triggers, ACKs, frame transfer)
+#   udp mode:    raspiCam.py-like clients driven by src/scannerMaster.py (multicast instructions,
+#                UDP heartbeats and responses); scannerMaster expects at most 21 cameras, 201 to 221
+# Every simulated camera gets its own loopback address, so the server sees one host per camera.
+# The agents share this machine's cores, so the measured spread is an upper bound of the rig's.
+
+CAMERA_OPTIONS = {
+    'open_time': 0.0, 'configure_time': 0.0, 'start_time': 0.0, 'stop_time': 0.0,
+    'jitter': 0.02, 'spike_probability': 0.001, 'failure_probability': 0.0,
+}
+
+# Loopback address of a simulated camera, unique up to 65535 cameras
+def simulated_ip(cam_num):
+    return f'127.0.{cam_num // 256}.{cam_num % 256}'
+
+# Worker process: run the agents of a slice of cameras, each in its own thread,
+# then report the capture start times of every camera
+def run_agents(cam_nums, work_folder, camera_options, sessions, results):
+    cameras = {}
+    threads = []
+    for cam_num in cam_nums:
+        camera = SimulatedCamera(seed=cam_num, **camera_options)
+        cameras[cam_num] = camera
+        ram_folder = os.path.join(work_folder, f'ram_{cam_num:03d}')
+        client_folder = os.path.join(work_folder, f'client_{cam_num:03d}')
+        os.makedirs(ram_folder, exist_ok=True)
+        os.makedirs(client_folder, exist_ok=True)
+        agent = CameraAgent('127.0.0.1', PORT, ram_folder=ram_folder, system_setup=False, poll_interval=0.1,
+                            camera_factory=lambda camera=camera: camera, camera_number=cam_num,
+                            source_ip=simulated_ip(cam_num), client_folder=client_folder)
+        thread = threading.Thread(target=agent.run, args=(sessions,), daemon=True)
+        threads.append(thread)
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put({cam_num: (camera.capture_starts, camera.failures) for cam_num, camera in cameras.items()})
+
+# Start the simulated agents in several processes, return the processes and the result queue
+def start_agents(num_cameras, work_folder, camera_options=None, sessions=1, processes=None):
+    processes = processes or os.cpu_count()
+    cam_nums = list(range(1, num_cameras + 1))
+    results = multiprocessing.Queue()
+    workers = []
+    for index in range(min(processes, num_cameras)):
+        worker = multiprocessing.Process(target=run_agents, args=(
+            cam_nums[index::processes], work_folder, camera_options or CAMERA_OPTIONS, sessions, results))
+        worker.start()
+        workers.append(worker)
+    return workers, results
+
+# Spread of the capture start over all cameras for each frame, in seconds
+def capture_spread(capture_starts):
+    frames = min(len(starts) for starts in capture_starts.values())
+    starts = np.array([starts[:frames] for starts in capture_starts.values()], dtype=np.int64)
+    return (starts.max(axis=0) - starts.min(axis=0)) / 1e9
+
+def report_spread(spread):
+    if len(spread):
+        print(f"Capture start spread over {len(spread)} frames: mean {spread.mean() * 1000:.2f} ms, "
+              f"p99 {np.percentile(spread, 99) * 1000:.2f} ms, max {spread.max() * 1000:.2f} ms")
+
+# One capture session of num_frames frames with the engine and num_cameras simulated agents
+def run_engine(num_cameras, num_frames=50, width=640, height=480, exposure_time=1000, delay=0.05,
+               camera_options=None, processes=None, capture_mode='file', buffer_count=1):
+    with tempfile.TemporaryDirectory() as work_folder:
+        workers, results = start_agents(num_cameras, work_folder, camera_options, processes=processes)
+        mode = ContinuousMode(os.path.join(work_folder, 'Speckle'), None, transfer_mode='sendfile')
+        session = CaptureSession(mode, width, height, exposure_time, delay, num_cameras=num_cameras, launch=None,
+                                 capture_mode=capture_mode, buffer_count=buffer_count)
+        metrics = session.run(max_frames=num_frames, wait_for_operator=False)
+        capture_starts = {}
+        failures = 0
+        for _ in workers:
+            for cam_num, (starts, camera_failures) in results.get().items():
+                capture_starts[cam_num] = starts
+                failures += camera_failures
+        for worker in workers:
+            worker.join()
+    spread = capture_spread(capture_starts)
+    report_spread(spread)
+    summary = metrics.summary()
+    summary["spread_mean_ms"] = float(spread.mean() * 1000) if len(spread) else None
+    summary["spread_max_ms"] = float(spread.max() * 1000) if len(spread) else None
+    summary["injected_failures"] = failures
+    return summary
+
+# Same encoding as Message.pack, without its debug print
+def pack(message):
+    return json.dumps(message.__dict__).encode()
+
+# raspiCam.py stand-in: heartbeats to the master, one capture per multicast 'pic' instruction
+class SimulatedRaspiCam(threading.Thread):
+    MCAST_GRP = '224.1.1.1'
+    MCAST_PORT = 5007
+    MASTER_PORT = 5005
+
+    def __init__(self, cam_id, image_folder, camera_options, master_ip='127.0.0.1'):
+        super().__init__(daemon=True)
+        self.cam_id = str(cam_id)
+        self.image_folder = image_folder
+        self.master_ip = master_ip
+        self.camera = SimulatedCamera(seed=cam_id, **camera_options)
+        self.camera.configure(self.camera.create_still_configuration(main={"size": (640, 480)}))
+        self.camera.start()
+        self.send_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.send_socket.bind((simulated_ip(cam_id), 0))
+        self.receive_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.receive_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.receive_socket.bind(('', self.MCAST_PORT))
+        mreq = struct.pack("4sl", socket.inet_aton(self.MCAST_GRP), socket.INADDR_ANY)
+        self.receive_socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+        self.receive_socket.settimeout(0.5)
+        self.running = True
+
+    def send(self, message):
+        message.destinationIp = self.master_ip
+        self.send_socket.sendto(pack(message), (self.master_ip, self.MASTER_PORT))
+
+    def heartbeat(self):
+        message = Message("heartBeat", self.cam_id)
+        message.timeStamp = time.time()
+        self.send(message)
+
+    def run(self):
+        beat = 0.0
+        while self.running:
+            if time.time() - beat >= 2:
+                beat = time.time()
+                self.heartbeat()
+            try:
+                data = self.receive_socket.recv(10240)
+            except socket.timeout:
+                continue
+            instruction = Message()
+            instruction.jsonToMessage(data)
+            if instruction.messageType == "quit":
+                break
+            if instruction.messageType == "pic":
+                response = Message("response", self.cam_id)
+                while time.time() < instruction.timeStamp:
+                    pass
+                try:
+                    self.camera.capture_file(os.path.join(self.image_folder, f'{self.cam_id}_{time.time()}.jpg'))
+                    response.picResponse(True, self.master_ip)
+                except RuntimeError as e:
+                    response.picResponse(False, self.master_ip, str(e))
+                self.send(response)
+
+# Drive the real scannerMaster.py with num_cameras simulated raspiCam clients.
+# Each 'pa' command makes every camera take one picture; the time until scannerMaster
+# reports all images received is measured from its output.
+def run_scanner_master(num_cameras=21, num_pictures=20, interval=1.0, camera_options=None):
+    if num_cameras > 21:
+        raise ValueError("scannerMaster.py expects at most 21 cameras (numCams)")
+    master = subprocess.Popen([sys.executable, '-u', 'scannerMaster.py'], cwd=SRC_FOLDER, text=True,
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    completions = []
+    completed = threading.Event()
+
+    def read_output():
+        for line in master.stdout:
+            if 'recieved all images' in line:
+                completions.append(time.time())
+                completed.set()
+
+    threading.Thread(target=read_output, daemon=True).start()
+    with tempfile.TemporaryDirectory() as image_folder:
+        cameras = [SimulatedRaspiCam(201 + index, image_folder, camera_options or CAMERA_OPTIONS)
+                   for index in range(num_cameras)]
+        for camera in cameras:
+            camera.start()
+        time.sleep(7)  # Let the master's 5 s watchdog count every camera as connected
+
+        latencies = []
+        for _ in range(num_pictures):
+            completed.clear()
+            sent = time.time()
+            master.stdin.write('pa\n')
+            master.stdin.flush()
+            if completed.wait(5.0):
+                latencies.append(completions[-1] - sent)
+            time.sleep(interval)
+
+        master.stdin.write('qa\n')
+        master.stdin.flush()
+        for camera in cameras:
+            camera.running = False
+        master.wait(timeout=10)
+        capture_starts = {camera.cam_id: camera.camera.capture_starts for camera in cameras}
+
+    print(f"scannerMaster: {len(latencies)}/{num_pictures} complete picture sets")
+    if latencies:
+        print(f"Instruction to all responses: mean {np.mean(latencies) * 1000:.1f} ms, "
+              f"max {np.max(latencies) * 1000:.1f} ms (includes the 200 ms trigger lead)")
+    spread = capture_spread(capture_starts)
+    report_spread(spread)
+    return latencies, spread
+
+# Usage: python Load_generator.py engine [cameras ...] [--request | --raw]   (default 12 64 256)
+#        python Load_generator.py udp [cameras]                              (default 21)
+# --request acknowledges the frames before encoding them (capture_request and the encode pool),
+# --raw also leaves the encoding to the server
+if __name__ == '__main__':
+    target = sys.argv[1] if len(sys.argv) > 1 else 'engine'
+    counts = [int(count) for count in sys.argv[2:] if not count.startswith('--')]
+    capture_mode = 'raw' if '--raw' in sys.argv else 'request' if '--request' in sys.argv else 'file'
+    if target == 'udp':
+        run_scanner_master(*(counts or [21]))
+    else:
+        for num_cameras in counts or [12, 64, 256]:
+            print(f"=== {num_cameras} simulated cameras")
+            summary = run_engine(num_cameras, capture_mode=capture_mode)
+            print(json.dumps(summary))
@@ -0,0 +1,121 @@
+import os
+import sys
+import glob
+import struct
+import multiprocessing
+import numpy as np
+from PIL import Image
+from Frame_receiver import FrameContainer, CONTAINER_NAME
+
+# Encodes the raw frames of a 'raw' capture session (Client/Raw_frame.py) on the server's cores.
+# Every frame is converted in a worker process of a pool: the YUV420 planes are sliced out of the buffer
+# with NumPy and the result is written next to the container, Cam_XX/img12.raw -> Cam_XX/img12.png.
+#   color 'gray': the Y plane only, full resolution and lossless in PNG (what the speckle DIC uses)
+#   color 'rgb':  YUV420 to RGB (full-range BT.601, the colour space of libcamera still captures)
+#   output 'png', 'jpg' or 'npy' (the array as is, no encoding)
+# The workers read the frames straight out of the received containers, nothing is extracted first.
+
+# Must match the raw frame format written by Client/Raw_frame.py
+RAW_MAGIC = b'RAWF'
+RAW_VERSION = 1
+RAW_HEADER_FORMAT = '<4sHHHHI'  # magic, version, pixel format, width, height, stride (bytes per Y row)
+RAW_EXTENSION = 'raw'
+YUV420 = 1
+
+JPEG_QUALITY = 95
+
+# Header fields and pixel bytes of a raw frame
+def parse_raw_frame(data):
+    magic, version, pixel_format, width, height, stride = struct.unpack_from(RAW_HEADER_FORMAT, data, 0)
+    if magic != RAW_MAGIC or version != RAW_VERSION:
+        raise ValueError("Not a CaptuRPi raw frame")
+    if pixel_format != YUV420:
+        raise ValueError(f"Unsupported pixel format {pixel_format}")
+    pixels = np.frombuffer(data, dtype=np.uint8, offset=struct.calcsize(RAW_HEADER_FORMAT))
+    return width, height, stride, pixels
+
+# Y, U and V planes of a YUV420 buffer without the row padding (views, no copy)
+def yuv420_planes(pixels, width, height, stride):
+    y_size = stride * height
+    chroma_stride = stride // 2
+    chroma_size = chroma_stride * (height // 2)
+    y = pixels[:y_size].reshape(height, stride)[:, :width]
+    u = pixels[y_size:y_size + chroma_size].reshape(height // 2, chroma_stride)[:, :width // 2]
+    v = pixels[y_size + chroma_size:y_size + 2 * chroma_size].reshape(height // 2, chroma_stride)[:, :width // 2]
+    return y, u, v
+
+# Full-range BT.601 YUV420 to RGB, chroma upsampled by repetition
+def yuv420_to_rgb(y, u, v):
+    u = np.repeat(np.repeat(u.astype(np.float32) - 128.0, 2, axis=0), 2, axis=1)[:y.shape[0], :y.shape[1]]
+    v = np.repeat(np.repeat(v.astype(np.float32) - 128.0, 2, axis=0), 2, axis=1)[:y.shape[0], :y.shape[1]]
+    y = y.astype(np.float32)
+    rgb = np.stack([y + 1.402 * v, y - 0.344136 * u - 0.714136 * v, y + 1.772 * u], axis=-1)
+    return np.clip(rgb, 0, 255).astype(np.uint8)
+
+# Convert the bytes of one raw frame and write the result; returns the output path
+def convert_frame(data, output_path, output='png', color='gray'):
+    width, height, stride, pixels = parse_raw_frame(data)
+    y, u, v = yuv420_planes(pixels, width, height, stride)
+    array = np.ascontiguousarray(y) if color == 'gray' else yuv420_to_rgb(y, u, v)
+    if output == 'npy':
+        np.save(output_path, array)
+    elif output == 'jpg':
+        Image.fromarray(array).save(output_path, quality=JPEG_QUALITY)
+    else:
+        Image.fromarray(array).save(output_path, compress_level=1)  # Fast deflate, the size gain of 9 is small on speckle
+    return output_path
+
+# Containers opened by a worker process, kept open for the next frames of the same camera
+open_containers = {}
+
+# Pool task: (container path or None, frame name or raw file path, output path, output, color)
+def convert_job(job):
+    container_path, name, output_path, output, color = job
+    if container_path is None:
+        with open(name, 'rb') as file:
+            data = file.read()
+    else:
+        if container_path not in open_containers:
+            open_containers[container_path] = FrameContainer(container_path)
+        data = open_containers[container_path].read(name)
+    try:
+        return convert_frame(data, output_path, output, color)
+    except (ValueError, OSError) as e:
+        print(f"Error: {name} could not be converted: {e}")
+        return None
+
+# Conversion jobs for the raw frames of a session folder: in the Cam_XX containers, and loose .raw files
+# (ZIP transfer, or containers already extracted)
+def session_jobs(folder, output='png', color='gray'):
+    jobs = []
+    for camera_folder in sorted(glob.glob(os.path.join(folder, 'Cam_*'))):
+        container_path = os.path.join(camera_folder, CONTAINER_NAME)
+        if os.path.exists(container_path):
+            with FrameContainer(container_path) as container:
+                names = [name for name in container.names() if name.endswith(f'.{RAW_EXTENSION}')]
+            jobs += [(container_path, name, os.path.join(camera_folder, f'{os.path.splitext(name)[0]}.{output}'),
+                      output, color) for name in names]
+        for path in sorted(glob.glob(os.path.join(camera_folder, f'*.{RAW_EXTENSION}'))):
+            jobs.append((None, path, f'{os.path.splitext(path)[0]}.{output}', output, color))
+    return jobs
+
+# Convert every raw frame of a session on a process pool, one worker per core by default
+def convert_session(folder, output='png', color='gray', processes=None):
+    jobs = session_jobs(folder, output, color)
+    if not jobs:
+        return []
+    processes = processes or os.cpu_count()
+    print(f"Converting {len(jobs)} raw frames to {output} on {processes} processes...")
+    # Consecutive frames of a camera go to the same worker, which keeps that container mapped
+    chunksize = max(1, len(jobs) // (processes * 4))
+    with multiprocessing.Pool(processes) as pool:
+        converted = [path for path in pool.imap(convert_job, jobs, chunksize=chunksize) if path]
+    print(f"{len(converted)} of {len(jobs)} raw frames converted.")
+    return converted
+
+# Usage: python Raw_converter.py <session folder> [png|jpg|npy] [gray|rgb]
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python Raw_converter.py <session folder> [png|jpg|npy] [gray|rgb]")
+        sys.exit(1)
+    convert_session(sys.argv[1], *sys.argv[2:4])
@@ -0,0 +1,103 @@
+import multiprocessing
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from Timing_results import pairwise_statistics
+
+# Per-camera offsets relative to the median frame: for every photo the reference is the
+# median time over all cameras, a camera's offset is the median of its deviations
+def median_offsets(matrix):
+    reference = np.nanmedian(matrix, axis=1, keepdims=True)
+    deviations = matrix - reference
+    offsets = np.nanmedian(deviations, axis=0)
+    return offsets, deviations
+
+# Per-camera offsets from a least-squares fit of all pairwise mean differences,
+# weighted by the number of photos each pair has in common; offsets sum to zero
+def least_squares_offsets(matrix):
+    pairwise_mean, _, counts = pairwise_statistics(matrix)
+    weights = counts.copy()
+    np.fill_diagonal(weights, 0.0)
+    laplacian = np.diag(weights.sum(axis=1)) - weights
+    target = np.nansum(weights * np.nan_to_num(pairwise_mean), axis=1)
+    system = np.vstack([laplacian, np.ones(len(laplacian))])
+    offsets = np.linalg.lstsq(system, np.append(target, 0.0), rcond=None)[0]
+    deviations = matrix - np.nanmean(matrix - offsets, axis=1, keepdims=True)
+    return offsets, deviations
+
+def camera_offsets(matrix, method='median'):
+    if method == 'lstsq':
+        return least_squares_offsets(matrix)
+    return median_offsets(matrix)
+
+# Draw the fixed set of summary plots; the number of figures does not depend on the camera count
+def plot_sync_summary(photos, cameras, deviations, pairwise_mean, relative_errors, suffix):
+    deviations_ms = deviations * 1000
+
+    # Heatmap of every camera's deviation from the reference, photo by photo
+    plt.figure(figsize=(15, 10))
+    limit = np.nanpercentile(np.abs(deviations_ms), 99) if np.isfinite(deviations_ms).any() else 1.0
+    plt.imshow(deviations_ms.T, aspect='auto', cmap='coolwarm', vmin=-limit, vmax=limit,
+               extent=[photos[0], photos[-1], len(cameras) + 0.5, 0.5], interpolation='nearest')
+    plt.colorbar(label='Deviation from reference (ms)')
+    plt.title('Capture Time Deviation per Camera')
+    plt.xlabel('Photo Index')
+    plt.ylabel('Camera')
+    plt.tight_layout()
+    plt.savefig(f'sync_deviation_heatmap_{suffix}.png')
+    plt.close()
+
+    # Distribution of each camera's deviations
+    plt.figure(figsize=(15, 10))
+    columns = [column[~np.isnan(column)] for column in deviations_ms.T]
+    plt.boxplot(columns, showfliers=False)
+    plt.xticks(np.arange(1, len(cameras) + 1), [str(cam_num) for cam_num in cameras])
+    plt.axhline(0, color='red', linestyle='--')  # Horizontal line at y=0
+    plt.title('Capture Time Deviation Distribution per Camera')
+    plt.xlabel('Camera')
+    plt.ylabel('Deviation from reference (ms)')
+    plt.grid()
+    plt.tight_layout()
+    plt.savefig(f'sync_deviation_boxplot_{suffix}.png')
+    plt.close()
+
+    # Mean difference of every camera pair
+    plt.figure(figsize=(12, 10))
+    plt.imshow(pairwise_mean * 1000, cmap='coolwarm', interpolation='nearest')
+    plt.colorbar(label='Mean difference (ms)')
+    ticks = np.arange(len(cameras))
+    step = max(1, len(cameras) // 16)
+    plt.xticks(ticks[::step], cameras[::step])
+    plt.yticks(ticks[::step], cameras[::step])
+    plt.title('Mean Capture Time Difference Between Cameras')
+    plt.xlabel('Camera')
+    plt.ylabel('Camera')
+    plt.tight_layout()
+    plt.savefig(f'sync_pairwise_mean_{suffix}.png')
+    plt.close()
+    print(f"Sync summary plots saved: sync_*_{suffix}.png")
+
+    # Distribution of each camera's relative error, one box per camera instead of one line
+    plt.figure(figsize=(15, 10))
+    columns = [column[~np.isnan(column)] for column in relative_errors.T]
+    plt.boxplot(columns, showfliers=False)
+    plt.plot(np.arange(1, len(cameras) + 1), np.nanmax(relative_errors, axis=0),
+             'rv', linestyle='none', label='Maximum')
+    plt.xticks(np.arange(1, len(cameras) + 1), [str(cam_num) for cam_num in cameras])
+    plt.title('Relative Error Distribution per Camera')
+    plt.xlabel('Camera')
+    plt.ylabel('relative errors %')
+    plt.grid()
+    plt.legend()
+    plt.tight_layout()
+    plt.savefig(f'relative_errors_{suffix}.png')
+    plt.close()
+    print(f"Relative errors plot saved: relative_errors_{suffix}.png")
+
+# Render the summary plots in a separate process so the caller does not wait on matplotlib
+def plot_sync_summary_async(photos, cameras, deviations, pairwise_mean, relative_errors, suffix):
+    process = multiprocessing.Process(target=plot_sync_summary,
+                                      args=(photos, cameras, deviations, pairwise_mean, relative_errors, suffix))
+    process.start()
+    return process
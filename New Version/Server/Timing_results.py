@@ -0,0 +1,61 @@
+import glob
+import numpy as np
+
+# Timing results are stored in long layout: one row per (camera, photo)
+# File size and load time grow with the number of cameras, pairwise values are derived on demand
+RESULT_FIELDS = ('camera', 'photo', 'time', 'error')
+# From the frame metadata: exposure start minus trigger time (s), exposure time (µs) and trigger time (ns since
+# the epoch), absent from older files
+METADATA_FIELDS = ('skew', 'exposure', 'trigger')
+
+def save_results(filename, results):
+    np.savez(filename, **{field: results[field] for field in RESULT_FIELDS + METADATA_FIELDS if field in results})
+
+def load_results(filename):
+    with np.load(filename) as data:
+        return {field: data[field] for field in RESULT_FIELDS + METADATA_FIELDS if field in data}
+
+# Concatenate the per-camera result files of a folder
+def merge_result_files(folder_path):
+    files = sorted(glob.glob(f"{folder_path}/*.npz"))
+    parts = [load_results(file) for file in files]
+    fields = [field for field in RESULT_FIELDS + METADATA_FIELDS if all(field in part for part in parts)]
+    return {field: np.concatenate([part[field] for part in parts]) for field in fields}
+
+# Pivot one field to a (photos x cameras) matrix, missing frames are NaN
+def capture_time_matrix(results, field='time'):
+    cameras = np.unique(results['camera'])
+    photos, rows = np.unique(results['photo'], return_inverse=True)
+    columns = np.searchsorted(cameras, results['camera'])
+    matrix = np.full((len(photos), len(cameras)), np.nan)
+    matrix[rows, columns] = results[field]
+    return photos, cameras, matrix
+
+# Photos whose rows hold frames of different triggers on different cameras: photo numbers shifted on a camera
+# (result files written before the photo was the trigger id), empty when the files have no trigger time
+def misaligned_photos(results):
+    if 'trigger' not in results:
+        return np.array([], dtype=np.int32)
+    photos, rows = np.unique(results['photo'], return_inverse=True)
+    first = np.full(len(photos), np.iinfo(np.int64).max)
+    last = np.full(len(photos), np.iinfo(np.int64).min)
+    np.minimum.at(first, rows, results['trigger'])
+    np.maximum.at(last, rows, results['trigger'])
+    return photos[first != last]
+
+# Mean, standard deviation and sample count of every pairwise difference t_i - t_j,
+# computed from matrix products without building the (photos x pairs) table
+# The t_i^2 + t_j^2 - 2 t_i t_j expansion is only numerically safe because 'time' and 'skew' hold seconds
+# relative to the trigger, not epoch timestamps
+def pairwise_statistics(matrix):
+    valid = (~np.isnan(matrix)).astype(float)
+    values = np.nan_to_num(matrix)
+    counts = valid.T @ valid
+    cross = values.T @ valid                  # sum of t_i over photos where j is valid
+    squares = (values ** 2).T @ valid         # sum of t_i^2 over photos where j is valid
+    products = values.T @ values
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (cross - cross.T) / counts
+        mean_square = (squares + squares.T - 2 * products) / counts
+        std = np.sqrt(np.maximum(mean_square - mean ** 2, 0.0))
+    return mean, std, counts